@@ -5,31 +5,94 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from database import DB
 from models import User
-import os
-from dotenv import load_dotenv
+from cache import LRUCache
+from settings import settings
+import asyncio
+import threading
 import bcrypt
-
-load_dotenv()
+from concurrent.futures import ThreadPoolExecutor
 
 # Secret key for JWT encoding/decoding
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
+SECRET_KEY = settings.secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
+# Authenticated requests skip the users lookup while the entry is fresh.
+# Keep the TTL short: it bounds how long a deleted user stays valid here.
+USER_CACHE_TTL = settings.auth_user_cache_ttl
+user_cache = LRUCache(max_entries=256, ttl=USER_CACHE_TTL)
+
+def invalidate_user(username: str):
+    """Call after changing a user's password or role."""
+    user_cache.pop(username)
+
+# bcrypt work factor for new hashes; older hashes are upgraded on login
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+# Each hash costs ~250 ms of CPU at 12 rounds. bcrypt releases the GIL, so a
+# small dedicated pool keeps login bursts off the event loop and away from
+# the default executor.
+_bcrypt_pool = ThreadPoolExecutor(max_workers=settings.bcrypt_workers, thread_name_prefix="bcrypt")
+# Hashes submitted and not finished yet, and how many of them are on a worker
+_bcrypt_pending = 0
+_bcrypt_running = 0
+_bcrypt_running_lock = threading.Lock()
+
+async def _run_bcrypt(fn, *args):
+    global _bcrypt_pending
+
+    def counted():
+        global _bcrypt_running
+        with _bcrypt_running_lock:
+            _bcrypt_running += 1
+        try:
+            return fn(*args)
+        finally:
+            with _bcrypt_running_lock:
+                _bcrypt_running -= 1
+
+    loop = asyncio.get_running_loop()
+    _bcrypt_pending += 1
+    try:
+        return await loop.run_in_executor(_bcrypt_pool, counted)
+    finally:
+        _bcrypt_pending -= 1
+
+def bcrypt_stats() -> dict:
+    """Worker count and pending/running/queued password hashes, for /metrics."""
+    return {
+        "workers": settings.bcrypt_workers,
+        "pending": _bcrypt_pending,
+        "running": _bcrypt_running,
+        "queued": max(_bcrypt_pending - _bcrypt_running, 0),
+    }
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     # Prepare passwords as bytes
     password_byte = plain_password.encode('utf-8')
     hashed_password_byte = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_byte, hashed_password_byte)
 
-def get_password_hash(password):
+def _hashpw(password: str) -> str:
     password_byte = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_byte, salt)
     return hashed.decode('utf-8')
 
+async def verify_password(plain_password, hashed_password):
+    return await _run_bcrypt(_checkpw, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await _run_bcrypt(_hashpw, password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<rounds>$<salt+hash>
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -53,8 +116,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-        
+
+    cached = user_cache.get(username)
+    if cached is not None:
+        return cached
+
     user = await DB.users.find_one({"username": username})
     if user is None:
         raise credentials_exception
-    return User(**user)
+    user = User(**user)
+    user_cache.set(username, user)
+    return user
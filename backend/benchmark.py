@@ -0,0 +1,395 @@
+"""
+Load-test harness: runs the FastAPI app in-process against local stand-ins
+and reports throughput and latency percentiles as JSON.
+
+    python benchmark.py [--scenarios catalog,leads,project_updates,chat]
+                        [--requests 500] [--concurrency 20]
+                        [--mongo-url mongodb://localhost:27017]
+                        [--upload-latency 0.05] [--gemini-latency 0.4]
+                        [--output results.json] [--compare baseline.json]
+
+Stand-ins:
+- MongoDB: mongomock-motor, or a real (local) mongod with --mongo-url. The
+  benchmark database is dropped first.
+- Cloudinary: a local HTTP server that answers the SDK's upload calls
+  (through `upload_prefix`) after --upload-latency seconds. The real upload
+  path still runs: executor, hashing and multipart encoding.
+- Gemini: a stub model that answers after --gemini-latency seconds (and
+  streams in a few chunks for /api/chat/stream).
+- SMTP: an aiosmtpd sink that the outbox worker delivers lead emails to.
+  Without aiosmtpd the outbox worker stays off.
+
+Extra packages: pip install mongomock-motor httpx aiosmtpd
+
+Results carry the git commit, so files from two checkouts can be compared
+with --compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Settings read at import time by the app modules
+os.environ.setdefault("MEDIA_DEDUP", "true")
+os.environ.setdefault("OUTBOX_POLL_INTERVAL", "1")
+# The stand-ins replace the SDKs, warming the real ones would only add noise
+os.environ.setdefault("WARM_SDKS", "false")
+
+import cloudinary
+import httpx
+
+import cloudinary_service
+import database
+import gemini
+
+SCENARIOS = ("catalog", "leads", "project_updates", "chat")
+QUESTIONS = [
+    "What's the best hardware for a damp kitchen?",
+    "How long does a 3BHK interior take?",
+    "Which tiles suit a south facing balcony?",
+    "Can you help with foundation waterproofing?",
+]
+
+
+# --- Stand-ins ---
+
+class FakeCloudinaryHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+
+    def do_POST(self):
+        # Path: /v1_1/<cloud>/<resource_type>/upload
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        time.sleep(self.latency)
+        parts = self.path.strip("/").split("/")
+        resource_type = parts[2] if len(parts) > 2 and parts[2] != "auto" else "image"
+        public_id = f"bench/{uuid.uuid4().hex}"
+        extension = "mp4" if resource_type == "video" else "jpg"
+        payload = json.dumps({
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "bytes": len(body),
+            "secure_url": f"https://res.cloudinary.com/bench/{resource_type}/upload/v1/{public_id}.{extension}",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_cloudinary(latency: float) -> ThreadingHTTPServer:
+    FakeCloudinaryHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCloudinaryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Configure the SDK first, then point it at the fake server
+    cloudinary_service.configure_cloudinary()
+    cloudinary.config(
+        cloud_name="bench", api_key="bench", api_secret="bench",
+        upload_prefix=f"http://127.0.0.1:{server.server_port}",
+    )
+    return server
+
+
+class StubChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubStream:
+    def __init__(self, text: str, latency: float):
+        self.words = text.split(" ")
+        self.latency = latency
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        size = max(len(self.words) // 4, 1)
+        for start in range(0, len(self.words), size):
+            await asyncio.sleep(self.latency / 4)
+            yield StubChunk(" ".join(self.words[start:start + size]) + " ")
+
+
+class StubChatSession:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def send_message_async(self, message: str, stream: bool = False):
+        reply = f"Thanks for asking about '{message[:40]}'. Share your number and Vinit will call you back."
+        if stream:
+            return StubStream(reply, self.latency)
+        await asyncio.sleep(self.latency)
+        return StubChunk(reply)
+
+
+class StubGeminiModel:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def start_chat(self, history=None):
+        return StubChatSession(self.latency)
+
+
+def start_smtp_sink():
+    """aiosmtpd sink on a free port, or None if aiosmtpd isn't installed."""
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.handlers import Sink
+    except ImportError:
+        print("aiosmtpd not installed: lead emails are not delivered during the run")
+        return None
+    controller = Controller(Sink(), hostname="127.0.0.1", port=0)
+    controller.start()
+    return controller
+
+
+def use_smtp_sink(controller):
+    import aiosmtplib
+    import email_service
+
+    port = controller.server.sockets[0].getsockname()[1]
+    # Credentials so the outbox worker starts; the sink ignores them (no login)
+    email_service.MAIL_USERNAME = email_service.MAIL_USERNAME or "bench"
+    email_service.MAIL_PASSWORD = email_service.MAIL_PASSWORD or "bench"
+    email_service.MAIL_FROM = "bench@example.com"
+
+    async def connect_plain():
+        # The sink speaks plain SMTP: no STARTTLS, no login
+        connection = email_service.smtp_connection
+        connection._smtp = aiosmtplib.SMTP(hostname="127.0.0.1", port=port, start_tls=False, timeout=30)
+        await connection._smtp.connect()
+        connection.last_used = asyncio.get_running_loop().time()
+
+    email_service.smtp_connection._connect = connect_plain
+
+
+def use_database(mongo_url: str):
+    """Points every module that imported `DB` at the benchmark database."""
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from metrics import MongoCommandTimer
+        bench_db = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandTimer()])["ramdev_benchmark"]
+    else:
+        import mongomock_motor
+        bench_db = mongomock_motor.AsyncMongoMockClient()["ramdev_benchmark"]
+    original = database.DB
+    for module in list(sys.modules.values()):
+        if getattr(module, "DB", None) is original:
+            module.DB = bench_db
+    return bench_db
+
+
+# --- Load generation ---
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_load(name: str, make_request, total: int, concurrency: int) -> dict:
+    """
+    Sends `total` requests with `concurrency` workers. `make_request(i)`
+    returns an httpx response; non-2xx and exceptions count as errors.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                ok = response.status_code < 400
+            except Exception as e:
+                print(f"[{name}] request failed: {e}")
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+    print(f"{name:16} {result['rps']:>9} req/s  p50 {result['p50_ms']:>8} ms  "
+          f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {errors}")
+    return result
+
+
+async def seed_catalog(db, count: int = 60):
+    await db.portfolio.insert_many([
+        {"title": f"Project {i}", "category": ["Residential", "Commercial", "Interior"][i % 3],
+         "scope": "Turnkey", "description": "Benchmark item", "size": "small", "media_type": "image",
+         "image_url": f"https://res.cloudinary.com/bench/image/upload/v1/bench/p{i}.jpg"}
+        for i in range(count)
+    ])
+    await db.hardware.insert_many([
+        {"name": f"Handle {i}", "description": "Brushed steel", "price": "499", "tag": "New Arrival",
+         "image_url": f"https://res.cloudinary.com/bench/image/upload/v1/bench/h{i}.jpg"}
+        for i in range(count)
+    ])
+    await db.project_updates.insert_many([
+        {"site_name": f"Site {i}", "category": "construction_active", "main_image": "", "version": 1,
+         "work_stages": [{"name": "Foundation", "images": []}], "updated_at": datetime.now()}
+        for i in range(count // 3)
+    ])
+
+
+def scenario_requests(client: httpx.AsyncClient, token: str, images_per_update: int):
+    auth = {"Authorization": f"Bearer {token}"}
+    catalog_paths = ["/api/portfolio", "/api/hardware", "/api/project-updates",
+                     "/api/portfolio?category=Interior", "/api/hardware?limit=20"]
+
+    async def catalog(i):
+        return await client.get(catalog_paths[i % len(catalog_paths)])
+
+    async def leads(i):
+        return await client.post("/api/leads", json={
+            "name": f"Bench Lead {i}", "phone": "+919876543210", "email": "lead@example.com",
+            "interest": "Kitchen Hardware" if i % 2 else "General Inquiry",
+        })
+
+    async def project_updates(i):
+        files = [("main_image", (f"main-{i}.jpg", os.urandom(64 * 1024), "image/jpeg"))]
+        files += [("stage_images_Foundation", (f"stage-{i}-{j}.jpg", os.urandom(64 * 1024), "image/jpeg"))
+                  for j in range(images_per_update)]
+        response = await client.post("/api/project-updates", headers=auth, files=files, data={
+            "site_name": f"Bench Site {i}", "category": "construction_active",
+            "work_stages": json.dumps(["Foundation"]),
+        })
+        # Failed uploads still answer 200; they'd make the numbers look too good
+        if response.status_code == 200 and response.json().get("failed_uploads"):
+            raise RuntimeError(response.json()["failed_uploads"][0]["error"])
+        return response
+
+    async def chat(i):
+        # Half repeat an opening question (cache hits), half are new sessions with unique text
+        if i % 2:
+            return await client.post("/api/chat", json={"message": QUESTIONS[i % len(QUESTIONS)]})
+        return await client.post("/api/chat", json={"message": f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})"})
+
+    return {"catalog": catalog, "leads": leads, "project_updates": project_updates, "chat": chat}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        deltas = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before.get(key):
+                deltas.append(f"{key} {(current[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"  {name:16} " + "  ".join(deltas))
+
+
+async def main(args):
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    import main as api
+    cloudinary_server = start_fake_cloudinary(args.upload_latency)
+    smtp_sink = start_smtp_sink()
+    bench_db = use_database(args.mongo_url)
+    await bench_db.client.drop_database("ramdev_benchmark")
+    gemini.set_model(StubGeminiModel(args.gemini_latency))
+    if smtp_sink:
+        use_smtp_sink(smtp_sink)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "config": {
+            "requests": args.requests, "concurrency": args.concurrency,
+            "mongo": "mongod" if args.mongo_url else "mongomock",
+            "upload_latency": args.upload_latency, "gemini_latency": args.gemini_latency,
+            "images_per_update": args.images_per_update, "smtp_sink": bool(smtp_sink),
+        },
+        "scenarios": {},
+    }
+
+    async with api.app.router.lifespan_context(api.app):
+        await seed_catalog(bench_db)
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            token = (await client.post("/token", data={"username": "admin", "password": "admin123"})).json()["access_token"]
+            requests = scenario_requests(client, token, args.images_per_update)
+            for name in selected:
+                # Uploads are slow by nature; keep that scenario's request count proportionate
+                total = max(args.requests // 10, 1) if name == "project_updates" else args.requests
+                results["scenarios"][name] = await run_load(name, requests[name], total, args.concurrency)
+
+        if smtp_sink:
+            # Let the outbox worker drain the lead emails before shutting down
+            await asyncio.sleep(2)
+            results["emails_pending"] = await bench_db.email_outbox.count_documents({"status": "pending"})
+
+    cloudinary_server.shutdown()
+    if smtp_sink:
+        smtp_sink.stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API against local stand-ins")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario (project_updates runs a tenth)")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight at once")
+    parser.add_argument("--mongo-url", default="", help="use a real mongod instead of mongomock")
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="seconds the fake Cloudinary takes per upload")
+    parser.add_argument("--gemini-latency", type=float, default=0.4, help="seconds the stub Gemini takes per reply")
+    parser.add_argument("--images-per-update", type=int, default=4, help="stage images per project update")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    asyncio.run(main(parser.parse_args()))
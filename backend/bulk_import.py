@@ -0,0 +1,174 @@
+import asyncio
+import csv
+import io
+import json
+import mimetypes
+import os
+import zipfile
+from tempfile import SpooledTemporaryFile
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+from starlette.datastructures import Headers
+
+from cloudinary_service import UPLOAD_CONCURRENCY, media_variants, upload_media
+from database import DB
+from settings import settings
+
+BULK_WRITE_BATCH_SIZE = settings.bulk_write_batch_size
+MAX_IMPORT_ROWS = settings.max_import_rows
+REQUIRED_FIELDS = ("name", "description", "price")
+
+
+def parse_manifest(filename: str, content: bytes) -> List[dict]:
+    """
+    Reads a CSV (header row) or JSON (list of objects) manifest. Each row has
+    name, description, price, optional tag, and either `image` (a file name
+    inside the zip) or `image_url` (an already hosted image).
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Manifest must be UTF-8")
+    try:
+        if filename.lower().endswith(".json"):
+            rows = json.loads(text)
+            if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+                raise ValueError("JSON manifest must be a list of objects")
+        else:
+            rows = list(csv.DictReader(io.StringIO(text)))
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=400, detail=f"Manifest has more than {MAX_IMPORT_ROWS} rows")
+    return [{k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k} for row in rows]
+
+
+def _extract_member(archive: zipfile.ZipFile, member: str) -> SpooledTemporaryFile:
+    # Same spill-to-disk behaviour as request uploads: small images stay in memory
+    spooled = SpooledTemporaryFile(max_size=1024 * 1024)
+    with archive.open(member) as source:
+        while True:
+            block = source.read(1024 * 1024)
+            if not block:
+                break
+            spooled.write(block)
+    spooled.seek(0)
+    return spooled
+
+
+async def _bulk_insert(products: List[tuple], report: List[dict]):
+    """
+    Inserts (row_index, document) pairs with ordered bulk_write batches. When
+    a document is rejected, the rest of its batch is resubmitted, so one bad
+    row never blocks the others.
+    """
+    for start in range(0, len(products), BULK_WRITE_BATCH_SIZE):
+        batch = products[start:start + BULK_WRITE_BATCH_SIZE]
+        while batch:
+            warning = None
+            try:
+                await DB.hardware.bulk_write([InsertOne(doc) for _, doc in batch], ordered=True)
+                done, batch = batch, []
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors") or []
+                if not write_errors:
+                    # Only writeConcernErrors: every document was written, but
+                    # not confirmed by as many members as requested
+                    concern_errors = e.details.get("writeConcernErrors") or [{}]
+                    warning = concern_errors[0].get("errmsg", "Write concern not satisfied")
+                    done, batch = batch, []
+                else:
+                    error = write_errors[0]
+                    failed_at = error["index"]
+                    done = batch[:failed_at]
+                    row_index, _ = batch[failed_at]
+                    report[row_index].update(status="failed", error=error.get("errmsg", "Write failed"))
+                    batch = batch[failed_at + 1:]
+            except Exception as e:
+                # Whole batch lost (e.g. connection error); report and move on
+                for row_index, _ in batch:
+                    report[row_index].update(status="failed", error=f"Database error: {e}")
+                done, batch = [], []
+            for row_index, doc in done:
+                # insert_one/bulk_write fill in _id on the submitted document
+                report[row_index].update(status="inserted", id=str(doc["_id"]))
+                if warning:
+                    report[row_index]["warning"] = warning
+
+
+async def import_hardware_catalog(manifest: UploadFile, images: Optional[UploadFile]) -> dict:
+    """
+    Imports a supplier catalog: uploads the referenced images concurrently,
+    then writes the products in ordered batches. Returns a per-row report;
+    failed rows are listed with their error and don't stop the import.
+    """
+    rows = parse_manifest(manifest.filename or "", await manifest.read())
+
+    archive = None
+    if images is not None:
+        try:
+            archive = zipfile.ZipFile(images.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="images must be a zip archive")
+    members = set(archive.namelist()) if archive else set()
+
+    report = [{"row": i + 1, "name": row.get("name"), "status": "pending"} for i, row in enumerate(rows)]
+    semaphore = asyncio.Semaphore(max(UPLOAD_CONCURRENCY, 1))
+
+    async def prepare(index: int, row: dict):
+        missing = [f for f in REQUIRED_FIELDS if not row.get(f)]
+        if missing:
+            report[index].update(status="failed", error=f"Missing {', '.join(missing)}")
+            return None
+
+        image_url = row.get("image_url")
+        member = row.get("image")
+        if not image_url:
+            if not member or member not in members:
+                report[index].update(status="failed", error=f"Image '{member}' not found in zip")
+                return None
+            async with semaphore:
+                spooled = None
+                try:
+                    # Local disk work, kept out of the upload executor's slots and stats
+                    spooled = await asyncio.to_thread(_extract_member, archive, member)
+                    content_type = mimetypes.guess_type(member)[0] or "application/octet-stream"
+                    upload = UploadFile(spooled, filename=os.path.basename(member),
+                                        headers=Headers({"content-type": content_type}))
+                    image_url = await upload_media(upload, folder="ramdev_hardware")
+                except Exception as e:
+                    report[index].update(status="failed", error=f"Upload failed: {e}")
+                    return None
+                finally:
+                    if spooled is not None:
+                        spooled.close()
+
+        return index, {
+            "name": row["name"],
+            "description": row["description"],
+            "price": str(row["price"]),
+            "tag": row.get("tag") or "New Arrival",
+            "image_url": image_url,
+            "image_variants": media_variants(image_url),
+        }
+
+    try:
+        prepared = await asyncio.gather(*(prepare(i, row) for i, row in enumerate(rows)))
+    finally:
+        if archive:
+            archive.close()
+
+    # Keep manifest order in the collection
+    await _bulk_insert([p for p in prepared if p], report)
+
+    inserted = sum(1 for r in report if r["status"] == "inserted")
+    return {
+        "status": "success" if inserted == len(rows) else "partial",
+        "total": len(rows),
+        "inserted": inserted,
+        "failed": len(rows) - inserted,
+        "rows": report,
+    }
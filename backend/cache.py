@@ -0,0 +1,163 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from serialization import dumps
+from settings import settings
+
+# Entries are dropped on every admin write, the TTL only matters when the data
+# is changed outside this process (another worker, migrate_to_cloudinary.py).
+CATALOG_CACHE_TTL = settings.catalog_cache_ttl
+# Filtered / paginated reads get their own entries, so keep the total bounded
+CATALOG_CACHE_MAX_ENTRIES = settings.catalog_cache_max_entries
+
+
+class ResponseCache:
+    """
+    Keeps serialized JSON response bodies per namespace (one per collection).
+    Each namespace has a version counter that is bumped on invalidation, so a
+    read that started before a write can never store its stale result.
+    """
+
+    def __init__(self, ttl: int = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._versions: Dict[str, int] = {}
+        # (namespace, key) -> (version, stored_at, body, etag)
+        self._entries: Dict[Tuple[str, str], Tuple[int, float, bytes, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get((namespace, key))
+        if entry is not None:
+            version, stored_at, body, etag = entry
+            fresh = not self.ttl or time.monotonic() - stored_at < self.ttl
+            if version == self.version(namespace) and fresh:
+                self.hits += 1
+                return body, etag
+            del self._entries[(namespace, key)]
+        self.misses += 1
+        return None
+
+    def set(self, namespace: str, key: str, version: int, body: bytes) -> Tuple[bytes, str]:
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        etag = f'"{namespace}-{version}-{digest}"'
+        # Only keep the body if no write happened while it was being built
+        if version == self.version(namespace):
+            if len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order, so this drops the oldest entry
+                del self._entries[next(iter(self._entries))]
+            self._entries[(namespace, key)] = (version, time.monotonic(), body, etag)
+        return body, etag
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self._versions[namespace] = self.version(namespace) + 1
+        for entry_key in [k for k in self._entries if k[0] in namespaces]:
+            del self._entries[entry_key]
+
+
+catalog_cache = ResponseCache()
+
+
+class LRUCache:
+    """
+    Bounded in-process mapping with least-recently-used eviction and a
+    per-entry TTL. Not shared between workers.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, value), most recently used last
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> int:
+        count = len(self._data)
+        self._data.clear()
+        return count
+
+    def items(self):
+        """(key, value, seconds_to_expiry) for live entries, oldest use first."""
+        now = time.monotonic()
+        return [(k, v, expires_at - now) for k, (expires_at, v) in self._data.items() if expires_at > now]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def cached_json_response(
+    request: Request,
+    namespace: str,
+    loader: Callable[[], Awaitable[object]],
+    key: str = "",
+) -> Response:
+    """
+    Serves a JSON body from `catalog_cache`, calling `loader` only on a miss.
+    Answers `304 Not Modified` when the client already holds the current ETag.
+    """
+    entry = catalog_cache.get(namespace, key)
+    if entry is None:
+        version = catalog_cache.version(namespace)
+        entry = catalog_cache.set(namespace, key, version, dumps(await loader()))
+    body, etag = entry
+
+    # no-cache lets browsers and the CDN keep the body but revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,33 @@
+import re
+from cache import LRUCache
+from settings import settings
+
+CHAT_CACHE_SIZE = settings.chat_cache_size
+CHAT_CACHE_TTL = settings.chat_cache_ttl
+# Dropping filler words merges more phrasings ("hi, the best..." / "best...")
+CHAT_CACHE_STOP_WORDS = settings.chat_cache_stop_words
+
+# Only words that never change what is asked: "how"/"should", "or", "do" etc.
+# would make different questions share a cached answer
+STOP_WORDS = {"a", "an", "the", "hi", "hello", "hey", "please", "pls", "kindly"}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+chat_response_cache = LRUCache(max_entries=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL)
+
+
+def normalize_question(message: str, drop_stop_words: bool = CHAT_CACHE_STOP_WORDS) -> str:
+    """
+    Cache key for a chat message: lowercased, punctuation removed, whitespace
+    collapsed and, optionally, filler words dropped. "Hi, what's the best
+    hardware for a damp kitchen?" and "whats the best hardware for damp
+    kitchen please" share a key.
+    """
+    text = _PUNCTUATION.sub(" ", message.lower().replace("'", ""))
+    words = _WHITESPACE.sub(" ", text).strip().split(" ")
+    if drop_stop_words:
+        kept = [w for w in words if w not in STOP_WORDS]
+        # A message made only of filler words keeps its original words
+        words = kept or words
+    return " ".join(w for w in words if w)
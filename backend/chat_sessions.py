@@ -0,0 +1,99 @@
+import re
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+from cache import LRUCache
+from database import DB
+from settings import settings
+
+CHAT_SESSION_CACHE_SIZE = settings.chat_session_cache_size
+# Idle sessions expire from memory and (via a TTL index) from Mongo
+CHAT_SESSION_TTL = settings.chat_session_ttl
+# Rough input budget for the history sent with each turn
+CHAT_HISTORY_TOKEN_BUDGET = settings.chat_history_token_budget
+
+# session_id -> history in Gemini format: [{"role": "user"|"model", "parts": [text]}]
+session_cache = LRUCache(max_entries=CHAT_SESSION_CACHE_SIZE, ttl=CHAT_SESSION_TTL)
+# Ids are minted here (uuid4 hex); anything else can't name an existing session
+_SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; avoids a count_tokens round trip
+    return len(text) // 4 + 1
+
+
+def trim_history(history: List[dict], budget: int = CHAT_HISTORY_TOKEN_BUDGET) -> List[dict]:
+    """
+    Keeps the most recent turns that fit in `budget` tokens. Turns are dropped
+    from the front in user/model pairs so the history still starts with a
+    user message, as Gemini expects.
+    """
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        cost = sum(estimate_tokens(str(part)) for part in turn.get("parts", []))
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    while kept and kept[0].get("role") != "user":
+        kept.pop(0)
+    return kept
+
+
+def _clean_client_history(history: list) -> List[dict]:
+    # ChatRequest.history comes from the browser, only keep well-formed turns
+    cleaned = []
+    for turn in history or []:
+        if not isinstance(turn, dict) or turn.get("role") not in ("user", "model"):
+            continue
+        parts = [str(p) for p in turn.get("parts", []) if isinstance(p, str)]
+        if parts:
+            cleaned.append({"role": turn["role"], "parts": parts})
+    return trim_history(cleaned)
+
+
+async def load_session(session_id: Optional[str], client_history: Optional[list] = None) -> Tuple[str, List[dict]]:
+    """
+    Returns (session_id, history). Unknown or missing ids start a new session
+    under a fresh id, seeded from the client-sent history if there is one: a
+    client never picks the key its session is stored under.
+    """
+    if session_id and _SESSION_ID.fullmatch(session_id):
+        history = session_cache.get(session_id)
+        if history is not None:
+            return session_id, history
+        try:
+            document = await DB.chat_sessions.find_one({"_id": session_id})
+        except Exception as e:
+            print(f"Chat session lookup failed: {e}")
+            document = None
+        if document:
+            history = document.get("history", [])
+            session_cache.set(session_id, history)
+            return session_id, history
+
+    return uuid.uuid4().hex, _clean_client_history(client_history)
+
+
+async def append_turn(session_id: str, history: List[dict], message: str, reply: str) -> List[dict]:
+    """
+    Adds a user/model exchange, trims to the token budget and stores the
+    result in memory and in Mongo (so sessions survive restarts).
+    """
+    history = trim_history(history + [
+        {"role": "user", "parts": [message]},
+        {"role": "model", "parts": [reply]},
+    ])
+    session_cache.set(session_id, history)
+    try:
+        await DB.chat_sessions.update_one(
+            {"_id": session_id},
+            {"$set": {"history": history, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"Chat session save failed: {e}")
+    return history
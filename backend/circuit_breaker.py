@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Tuple, Type
+
+from pymongo.errors import ConnectionFailure
+
+from settings import settings
+
+# Consecutive connection failures that open the Mongo breaker
+MONGO_BREAKER_FAILURES = settings.mongo_breaker_failures
+# Seconds the breaker stays open before letting one trial call through
+MONGO_BREAKER_RESET = settings.mongo_breaker_reset
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency the breaker considers down."""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` consecutive failures
+    it opens and calls fail fast with CircuitOpen. Once `reset_timeout` has
+    passed it is half-open: one trial call goes through, and its outcome
+    closes or re-opens the breaker.
+
+    Only `failure_types` (and timeouts) count as failures; any other error
+    means the dependency answered, so it counts as a success and is re-raised.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float,
+                 failure_types: Tuple[Type[BaseException], ...] = (ConnectionFailure,)):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_types = failure_types + (asyncio.TimeoutError,)
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print(f"Circuit {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"Circuit {self.name} open after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    async def call(self, operation: Callable[[], Awaitable], timeout: float):
+        """
+        Awaits `operation()` within `timeout` seconds, or raises CircuitOpen
+        straight away while the breaker is open.
+        """
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable")
+        try:
+            result = await asyncio.wait_for(operation(), timeout)
+        except self.failure_types:
+            self.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # The caller went away, nothing was learned about the dependency
+            self._trial_running = False
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+# Guards lead writes only (lead_spool.save_lead and the spool replay): they have
+# somewhere else to go when Atlas is down. Other reads and writes use DB directly
+# and still wait out Motor's own timeouts.
+mongo_breaker = CircuitBreaker("mongodb", MONGO_BREAKER_FAILURES, MONGO_BREAKER_RESET)
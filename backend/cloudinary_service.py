@@ -1,57 +1,290 @@
-import cloudinary
-import cloudinary.uploader
-import shutil
+import asyncio
+import hashlib
 import os
+import re
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
 from fastapi import UploadFile
+from database import DB
+from metrics import timed
+from settings import settings
+from upload_executor import UploadQueueFull, upload_executor
 
-# Configure Cloudinary
-# Assuming env vars are loaded in main.py or here
-cloudinary.config( 
-  cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"), 
-  api_key = os.getenv("CLOUDINARY_API_KEY"), 
-  api_secret = os.getenv("CLOUDINARY_API_SECRET"),
-  secure = True
+# Files above this size go through Cloudinary's chunked upload API, so at most
+# one chunk is held in memory. Cloudinary requires chunks of at least 5 MB.
+LARGE_UPLOAD_THRESHOLD = settings.cloudinary_large_upload_threshold
+UPLOAD_CHUNK_SIZE = max(settings.cloudinary_upload_chunk_size, 5 * 1024 * 1024)
+# How many files of one request are uploaded at the same time
+UPLOAD_CONCURRENCY = settings.cloudinary_upload_concurrency
+# Reuse the existing asset when the same bytes are uploaded again
+MEDIA_DEDUP = settings.media_dedup
+HASH_BLOCK_SIZE = 1024 * 1024
+# Widths offered in each image's srcset; the largest is also used for `src`
+RESPONSIVE_WIDTHS = list(settings.responsive_widths)
+VIDEO_POSTER_WIDTH = settings.video_poster_width
+# Ask Cloudinary to derive the resized versions at upload time (warm CDN, costs transformation credits)
+CLOUDINARY_EAGER = settings.cloudinary_eager
+
+_configure_lock = threading.Lock()
+_configured = False
+
+
+def configure_cloudinary():
+    """
+    Imports and configures the Cloudinary SDK on first use (an upload, or the
+    warm-up after startup) instead of at import time. Safe from any thread;
+    returns the `cloudinary.uploader` module.
+    """
+    global _configured
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                import cloudinary
+                import cloudinary.uploader  # noqa: F401
+                cloudinary.config(
+                    cloud_name=settings.cloudinary_cloud_name,
+                    api_key=settings.cloudinary_api_key,
+                    api_secret=settings.cloudinary_api_secret,
+                    secure=True,
+                )
+                _configured = True
+    import cloudinary.uploader
+    return cloudinary.uploader
+
+
+_CLOUDINARY_URL = re.compile(
+    r"^https?://res\.cloudinary\.com/(?P<cloud_name>[^/]+)/(?P<resource_type>image|video)/upload/(?:.*?/)?v(?P<version>\d+)/(?P<public_id>.+?)(?:\.\w+)?$"
 )
 
-async def upload_image_to_cloudinary(file: UploadFile, folder: str = "ramdev_builders"):
+
+def _variant_transformation(width: int) -> dict:
+    # c_limit never upscales, so small originals keep their own size
+    return {"width": width, "crop": "limit", "quality": "auto", "fetch_format": "auto"}
+
+
+def _eager_transformations(resource_type: str) -> List[dict]:
+    # f_auto is negotiated per request, so only the resize + q_auto step is derived ahead of time
+    if resource_type == "video":
+        return [{"width": VIDEO_POSTER_WIDTH, "crop": "limit", "quality": "auto", "start_offset": "0", "format": "jpg"}]
+    return [{"width": width, "crop": "limit", "quality": "auto"} for width in RESPONSIVE_WIDTHS]
+
+
+def media_variants(url: Optional[str]) -> Optional[dict]:
     """
-    Uploads a file to Cloudinary and returns the secure URL.
-    Handles both images and videos.
-    """
-    
-    # Cloudinary upload is synchronous, so we might need to run it in a threadpool 
-    # if we wanted to be strictly non-blocking, but for simplicity we'll call it directly
-    # or better, use `run_in_executor` if traffic is high.
-    
-    # For now, let's keep it simple. Cloudinary's python SDK handles it well.
-    
-    try:
-        # Determine resource type
-        resource_type = "auto" # automatically detect image vs video
-        
-        # Read file content - use run_in_executor for the blocking upload call to not freeze async loop
-        # For small files, await file.read() is okay. For large files, this consumes RAM.
-        # But cloudinary.uploader.upload expects a file-like object or content.
-        
-        content = await file.read()
-
-        import asyncio
-        from functools import partial
-        
-        loop = asyncio.get_running_loop()
-        upload_result = await loop.run_in_executor(
-            None, 
-            partial(
-                cloudinary.uploader.upload, 
-                content, 
-                folder=folder, 
-                resource_type=resource_type
+    Delivery URLs for a Cloudinary asset, built locally with `cloudinary_url`
+    (no API call). Images get a width-based `srcset` with f_auto/q_auto and a
+    `src` fallback; videos get a q_auto `src` and a JPEG `poster` frame.
+    Returns None for URLs that aren't Cloudinary uploads (e.g. /uploads/).
+    """
+    match = _CLOUDINARY_URL.match(url or "")
+    if not match:
+        return None
+    from cloudinary.utils import cloudinary_url
+    public_id = match.group("public_id")
+    # The cloud in the stored URL, so variants stay valid even if the env changes
+    options = {"cloud_name": match.group("cloud_name"), "version": match.group("version"), "secure": True}
+
+    if match.group("resource_type") == "video":
+        src, _ = cloudinary_url(public_id, resource_type="video", **options,
+                                transformation=[{"quality": "auto", "fetch_format": "auto"}])
+        poster, _ = cloudinary_url(public_id, resource_type="video", format="jpg", **options,
+                                   transformation=[{"width": VIDEO_POSTER_WIDTH, "crop": "limit",
+                                                    "quality": "auto", "start_offset": "0"}])
+        return {"src": src, "poster": poster}
+
+    srcset = []
+    for width in RESPONSIVE_WIDTHS:
+        variant, _ = cloudinary_url(public_id, **options, transformation=[_variant_transformation(width)])
+        srcset.append(f"{variant} {width}w")
+    src, _ = cloudinary_url(public_id, **options, transformation=[_variant_transformation(RESPONSIVE_WIDTHS[-1])])
+    return {"src": src, "srcset": ", ".join(srcset)}
+
+
+def media_variant_list(urls: List[str]) -> List[dict]:
+    """
+    `media_variants` for several URLs, as [{"url": ..., **variants}] entries;
+    the shape project updates keep next to their main and stage images.
+    """
+    entries = []
+    for url in dict.fromkeys(urls):
+        variants = media_variants(url)
+        if variants:
+            entries.append({"url": url, **variants})
+    return entries
+
+
+class _ChunkReader:
+    """
+    Read-only view over the upload's spooled temp file. The SDK closes the
+    stream it is given when a chunked upload finishes; this keeps the
+    underlying UploadFile open so FastAPI can clean it up as usual.
+    """
+
+    def __init__(self, fileobj, name: str):
+        self._file = fileobj
+        self.name = name
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _resource_type(content_type: str) -> str:
+    # The chunked API needs an explicit type for videos, "auto" works for the rest
+    if content_type and content_type.startswith("video/"):
+        return "video"
+    if content_type and content_type.startswith("image/"):
+        return "image"
+    return "auto"
+
+
+def _hash_stream(reader: _ChunkReader) -> str:
+    """
+    SHA-256 of the whole file, read block by block from the spooled temp file.
+    """
+    digest = hashlib.sha256()
+    reader.seek(0)
+    while True:
+        block = reader.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        digest.update(block)
+    reader.seek(0)
+    return digest.hexdigest()
+
+
+def _upload_stream(reader: _ChunkReader, folder: str, resource_type: str) -> dict:
+    """
+    Blocking upload of `reader`, run in an executor thread. Small files are
+    sent in one request; larger ones are streamed from disk chunk by chunk.
+    """
+    reader.seek(0, os.SEEK_END)
+    size = reader.tell()
+    reader.seek(0)
+
+    uploader = configure_cloudinary()
+    options = {}
+    if CLOUDINARY_EAGER and resource_type in ("image", "video"):
+        options = {"eager": _eager_transformations(resource_type), "eager_async": True}
+
+    if size > LARGE_UPLOAD_THRESHOLD:
+        with timed("cloudinary", "upload_large"):
+            return uploader.upload_large(
+                reader,
+                folder=folder,
+                resource_type=resource_type,
+                chunk_size=UPLOAD_CHUNK_SIZE,
+                filename=reader.name,
+                **options,
             )
+    with timed("cloudinary", "upload"):
+        return uploader.upload(
+            reader,
+            folder=folder,
+            resource_type=resource_type,
+            filename=reader.name,
+            **options,
         )
-        
-        # Return the secure URL
-        return upload_result.get("secure_url")
 
+
+async def upload_media(file: UploadFile, folder: str = "ramdev_builders") -> str:
+    """
+    Uploads a file to Cloudinary and returns the secure URL, raising on failure.
+
+    The content is read straight from the request's spooled temp file inside
+    the executor thread, never copied into memory as a whole. Files already
+    uploaded before (same SHA-256, see `media_hashes`) return the stored URL.
+    """
+    reader = _ChunkReader(file.file, file.filename or "upload")
+    resource_type = _resource_type(file.content_type)
+
+    content_hash = None
+    if MEDIA_DEDUP:
+        # Local disk and CPU work: kept out of the upload executor's slots and stats
+        content_hash = await asyncio.to_thread(_hash_stream, reader)
+        try:
+            known = await DB.media_hashes.find_one({"_id": content_hash})
+        except Exception as e:
+            # Dedup is an optimisation, a lookup failure shouldn't block the upload
+            print(f"media_hashes lookup failed: {e}")
+            known, content_hash = None, None
+        if known:
+            print(f"Reusing existing Cloudinary asset for {reader.name}: {known['secure_url']}")
+            return known["secure_url"]
+
+    upload_result = await upload_executor.run(_upload_stream, reader, folder, resource_type)
+
+    secure_url = upload_result.get("secure_url")
+    if not secure_url:
+        raise RuntimeError("Cloudinary returned no secure_url")
+
+    if content_hash:
+        # $setOnInsert: if two identical files raced, the first URL stays canonical
+        try:
+            await DB.media_hashes.update_one(
+                {"_id": content_hash},
+                {"$setOnInsert": {
+                    "secure_url": secure_url,
+                    "public_id": upload_result.get("public_id"),
+                    "resource_type": upload_result.get("resource_type"),
+                    "bytes": upload_result.get("bytes"),
+                    "created_at": datetime.now(),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"media_hashes insert failed: {e}")
+    return secure_url
+
+
+async def upload_image_to_cloudinary(file: UploadFile, folder: str = "ramdev_builders"):
+    """
+    Uploads a file to Cloudinary and returns the secure URL.
+    Handles both images and videos. Returns None if the upload fails;
+    UploadQueueFull is left to propagate so the caller answers 503.
+    """
+    try:
+        return await upload_media(file, folder)
+    except UploadQueueFull:
+        raise
     except Exception as e:
         print(f"Cloudinary Upload Error: {e}")
         return None
+
+
+async def upload_many(
+    files: List[UploadFile],
+    folder: str = "ramdev_builders",
+    concurrency: int = UPLOAD_CONCURRENCY,
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Uploads `files` with at most `concurrency` in flight at once.
+    Returns one (secure_url, error) pair per file, in the order of `files`.
+    UploadQueueFull propagates, so the request answers 503 instead of being
+    saved without its media.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def upload_one(file: UploadFile):
+        async with semaphore:
+            try:
+                return await upload_media(file, folder), None
+            except UploadQueueFull:
+                raise
+            except Exception as e:
+                print(f"Cloudinary Upload Error ({file.filename}): {e}")
+                return None, str(e) or type(e).__name__
+
+    return await asyncio.gather(*(upload_one(file) for file in files))
@@ -1,15 +1,82 @@
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
+import threading
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from metrics import MongoCommandTimer
+from settings import settings
 
-load_dotenv()
-
-MONGODB_URL = os.getenv("MONGODB_URL")
+MONGODB_URL = settings.mongodb_url
 if not MONGODB_URL:
     print("Warning: MONGODB_URL not set in environment variables.")
 
-CLIENT = AsyncIOMotorClient(MONGODB_URL)
-DB = CLIENT["ramdev_builders_db"]
+DATABASE_NAME = "ramdev_builders_db"
+
+_client_lock = threading.Lock()
+_client = None
+
+def get_client():
+    """The Motor client, created (and Motor imported) on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                # The listener feeds Mongo command timings into /metrics
+                _client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[MongoCommandTimer()])
+    return _client
+
+class _LazyDatabase:
+    """
+    Stands in for the Motor database so modules can keep `from database import
+    DB` and `DB.leads` / `DB[name]`, while the client is only built when the
+    first query needs it.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_client()[DATABASE_NAME], name)
+
+    def __getitem__(self, name):
+        return get_client()[DATABASE_NAME][name]
+
+DB = _LazyDatabase()
+
+# Indexes backing the queries in main.py / auth.py, keyed by collection
+INDEXES = {
+    "leads": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("interest", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="interest_created_at_id"),
+    ],
+    "portfolio": [
+        IndexModel([("category", ASCENDING), ("media_type", ASCENDING), ("_id", ASCENDING)], name="category_media_type_id"),
+        IndexModel([("media_type", ASCENDING), ("_id", ASCENDING)], name="media_type_id"),
+    ],
+    "hardware": [
+        IndexModel([("tag", ASCENDING), ("_id", ASCENDING)], name="tag_id"),
+    ],
+    "chat_sessions": [
+        # Drops idle consultant conversations, see chat_sessions.CHAT_SESSION_TTL
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl",
+                   expireAfterSeconds=settings.chat_session_ttl),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        # One notification per lead, see email_service.send_lead_notification
+        IndexModel([("lead_id", ASCENDING)], name="lead_id", unique=True,
+                   partialFilterExpression={"lead_id": {"$exists": True}}),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+}
 
 async def get_database():
     return DB
+
+async def ensure_indexes():
+    """
+    Creates the indexes in INDEXES. Existing indexes are a no-op on the server,
+    so this is safe to run on every startup.
+    """
+    for collection, indexes in INDEXES.items():
+        try:
+            await DB[collection].create_indexes(indexes)
+        except Exception as e:
+            print(f"Index creation failed for {collection}: {e}")
@@ -1,78 +1,327 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from pydantic import EmailStr
-import os
-from dotenv import load_dotenv
+from email.message import EmailMessage
+from email.utils import formataddr
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import DB
+from metrics import timed
+from settings import settings
+import aiosmtplib
+import asyncio
+import html
+import random
+import threading
 
-load_dotenv()
+MAIL_USERNAME = settings.mail_username
+MAIL_PASSWORD = settings.mail_password
+MAIL_FROM = settings.mail_from
+MAIL_PORT = settings.mail_port
+MAIL_SERVER = settings.mail_server
+MAIL_FROM_NAME = settings.mail_from_name
 
-# Load env vars
-MAIL_USERNAME = os.getenv("MAIL_USERNAME")
-MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
-MAIL_FROM = os.getenv("MAIL_FROM")
-MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
-MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
-MAIL_FROM_NAME = os.getenv("MAIL_FROM_NAME", "Ramdev Builders Website")
+# Outbox worker settings
+OUTBOX_BATCH_SIZE = settings.outbox_batch_size
+OUTBOX_POLL_INTERVAL = settings.outbox_poll_interval
+OUTBOX_MAX_ATTEMPTS = settings.outbox_max_attempts
+# Send one summary email when several leads are waiting, instead of one each
+OUTBOX_DIGEST = settings.outbox_digest
+# A claimed message not marked sent within this time is picked up again
+OUTBOX_LEASE_SECONDS = 300
+# Close the SMTP connection after this long without sending
+SMTP_IDLE_TIMEOUT = settings.smtp_idle_timeout
 
 # Helper to check if email is configured
 def is_email_configured():
     return bool(MAIL_USERNAME and MAIL_PASSWORD and MAIL_FROM)
 
-if is_email_configured():
-    conf = ConnectionConfig(
-        MAIL_USERNAME=MAIL_USERNAME,
-        MAIL_PASSWORD=MAIL_PASSWORD,
-        MAIL_FROM=MAIL_FROM,
-        MAIL_PORT=MAIL_PORT,
-        MAIL_SERVER=MAIL_SERVER,
-        MAIL_STARTTLS=True,
-        MAIL_SSL_TLS=False,
-        USE_CREDENTIALS=True,
-        VALIDATE_CERTS=True
-    )
-else:
-    conf = None
+_mail_config_lock = threading.Lock()
+_mail_config = None
 
-async def send_lead_notification(lead_data: dict):
+def get_mail_config():
     """
-    Sends an email notification when a new lead is submitted.
+    fastapi-mail ConnectionConfig, built on first use: the package is only
+    needed for the admin test email, so it isn't imported at startup.
+    Returns None when email is not configured.
     """
-    if not conf:
-        print("⚠️ Email notification SKIPPED: MAIL_USERNAME or MAIL_PASSWORD not set in .env")
-        print(f"   Lead Data: {lead_data}")
-        return
+    global _mail_config
+    if _mail_config is None and is_email_configured():
+        with _mail_config_lock:
+            if _mail_config is None:
+                from fastapi_mail import ConnectionConfig
+                _mail_config = ConnectionConfig(
+                    MAIL_USERNAME=MAIL_USERNAME,
+                    MAIL_PASSWORD=MAIL_PASSWORD,
+                    MAIL_FROM=MAIL_FROM,
+                    MAIL_PORT=MAIL_PORT,
+                    MAIL_SERVER=MAIL_SERVER,
+                    MAIL_STARTTLS=True,
+                    MAIL_SSL_TLS=False,
+                    USE_CREDENTIALS=True,
+                    VALIDATE_CERTS=True
+                )
+    return _mail_config
 
-    html = f"""
+def _lead_html(lead_data: dict) -> str:
+    return f"""
     <div style="font-family: Arial, sans-serif; padding: 20px; border: 1px solid #eee; border-radius: 5px;">
         <h2 style="color: #2c3e50;">New Inquiry Received</h2>
         <p>You have a new lead from the website:</p>
         <hr style="border: 0; border-top: 1px solid #eee;">
-        <p><strong>Name:</strong> {lead_data.get('name')}</p>
-        <p><strong>Phone:</strong> <a href="tel:{lead_data.get('phone')}">{lead_data.get('phone')}</a></p>
-        <p><strong>Email:</strong> {lead_data.get('email', 'N/A')}</p>
-        <p><strong>Interest:</strong> {lead_data.get('interest')}</p>
+        <p><strong>Name:</strong> {html.escape(str(lead_data.get('name')))}</p>
+        <p><strong>Phone:</strong> <a href="tel:{html.escape(str(lead_data.get('phone')))}">{html.escape(str(lead_data.get('phone')))}</a></p>
+        <p><strong>Email:</strong> {html.escape(str(lead_data.get('email') or 'N/A'))}</p>
+        <p><strong>Interest:</strong> {html.escape(str(lead_data.get('interest')))}</p>
+        <br>
+        <p style="font-size: 12px; color: #7f8c8d;">This is an automated message from Ramdev Builders System.</p>
+    </div>
+    """
+
+def _digest_html(leads: List[dict]) -> str:
+    rows = "".join(
+        f"<tr><td>{html.escape(str(l.get('name')))}</td>"
+        f"<td><a href=\"tel:{html.escape(str(l.get('phone')))}\">{html.escape(str(l.get('phone')))}</a></td>"
+        f"<td>{html.escape(str(l.get('email') or 'N/A'))}</td>"
+        f"<td>{html.escape(str(l.get('interest')))}</td></tr>"
+        for l in leads
+    )
+    return f"""
+    <div style="font-family: Arial, sans-serif; padding: 20px; border: 1px solid #eee; border-radius: 5px;">
+        <h2 style="color: #2c3e50;">{len(leads)} New Inquiries Received</h2>
+        <table cellpadding="6" style="border-collapse: collapse;">
+            <tr><th align="left">Name</th><th align="left">Phone</th><th align="left">Email</th><th align="left">Interest</th></tr>
+            {rows}
+        </table>
         <br>
         <p style="font-size: 12px; color: #7f8c8d;">This is an automated message from Ramdev Builders System.</p>
     </div>
     """
 
-    try:
-        message = MessageSchema(
-            subject=f"New Lead: {lead_data.get('name')} - {lead_data.get('interest')}",
-            recipients=[MAIL_FROM],  # Send to the owner
-            body=html,
-            subtype=MessageType.html
+def _build_message(subject: str, body: str, to: str) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr((MAIL_FROM_NAME, MAIL_FROM))
+    message["To"] = to
+    message.set_content("This message requires an HTML capable email client.")
+    message.add_alternative(body, subtype="html")
+    return message
+
+
+class SMTPConnection:
+    """
+    One long-lived SMTP session shared by all outbox sends. Connects (and
+    logs in) lazily, reconnects once if the server dropped us, and is closed
+    by the worker after SMTP_IDLE_TIMEOUT without traffic.
+    """
+
+    def __init__(self):
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self.last_used = 0.0
+
+    async def _connect(self):
+        smtp = aiosmtplib.SMTP(
+            hostname=MAIL_SERVER,
+            port=MAIL_PORT,
+            start_tls=True,
+            validate_certs=True,
+            timeout=30,
+        )
+        try:
+            with timed("smtp", "connect"):
+                await smtp.connect()
+                await smtp.login(MAIL_USERNAME, MAIL_PASSWORD)
+        except BaseException:
+            # A connected but unauthenticated session would pass the
+            # is_connected check in send(); only keep it once logged in
+            smtp.close()
+            self._smtp = None
+            raise
+        self._smtp = smtp
+        self.last_used = asyncio.get_running_loop().time()
+
+    async def send(self, message: EmailMessage):
+        for attempt in range(2):
+            if self._smtp is None or not self._smtp.is_connected:
+                await self._connect()
+            try:
+                with timed("smtp", "send"):
+                    await self._smtp.send_message(message)
+                self.last_used = asyncio.get_running_loop().time()
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if attempt == 1:
+                    raise
+
+    async def close(self):
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+        self._smtp = None
+
+    async def close_if_idle(self):
+        if self._smtp is not None and asyncio.get_running_loop().time() - self.last_used > SMTP_IDLE_TIMEOUT:
+            await self.close()
+
+
+smtp_connection = SMTPConnection()
+_outbox_wakeup: Optional[asyncio.Event] = None
+
+
+async def send_lead_notification(lead_data: dict):
+    """
+    Queues an email notification for a new lead in the `email_outbox`
+    collection. The outbox worker sends it, so it survives restarts and
+    SMTP outages. Idempotent per lead id: queuing the same lead twice (e.g.
+    a spool replay after the first insert did land) sends one email.
+    """
+    if not is_email_configured():
+        print("⚠️ Email notification SKIPPED: MAIL_USERNAME or MAIL_PASSWORD not set in .env")
+        print(f"   Lead Data: {lead_data}")
+        return
+
+    payload = {k: lead_data.get(k) for k in ("name", "phone", "email", "interest")}
+    now = datetime.now()
+    message = {
+        "kind": "lead",
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    if lead_data.get("_id") is None:
+        await DB.email_outbox.insert_one(message)
+    else:
+        lead_id = payload["lead_id"] = str(lead_data["_id"])
+        try:
+            await DB.email_outbox.update_one({"lead_id": lead_id}, {"$setOnInsert": message}, upsert=True)
+        except DuplicateKeyError:
+            # A concurrent enqueue of the same lead won the upsert
+            pass
+    if _outbox_wakeup is not None:
+        _outbox_wakeup.set()
+
+
+async def _claim_batch() -> List[dict]:
+    """
+    Atomically marks up to OUTBOX_BATCH_SIZE due messages as `sending`, so
+    several workers (or a restarted one) never send the same message twice
+    within a lease.
+    """
+    batch = []
+    now = datetime.now()
+    for _ in range(OUTBOX_BATCH_SIZE):
+        document = await DB.email_outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": "sending", "lease_until": now + timedelta(seconds=OUTBOX_LEASE_SECONDS)}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is None:
+            break
+        batch.append(document)
+    return batch
+
+
+async def _mark_sent(documents: List[dict]):
+    await DB.email_outbox.update_many(
+        {"_id": {"$in": [d["_id"] for d in documents]}},
+        {"$set": {"status": "sent", "sent_at": datetime.now()}, "$unset": {"lease_until": ""}},
+    )
+
+
+async def _mark_failed(document: dict, error: Exception):
+    attempts = document.get("attempts", 0) + 1
+    # Exponential backoff with jitter: ~30s, 1m, 2m ... capped at 1h
+    delay = min(3600, 30 * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+    status = "failed" if attempts >= OUTBOX_MAX_ATTEMPTS else "pending"
+    await DB.email_outbox.update_one(
+        {"_id": document["_id"]},
+        {"$set": {
+            "status": status,
+            "attempts": attempts,
+            "last_error": str(error),
+            "next_attempt_at": datetime.now() + timedelta(seconds=delay),
+        }, "$unset": {"lease_until": ""}},
+    )
+    print(f"❌ Failed to send email ({attempts}/{OUTBOX_MAX_ATTEMPTS}): {error}")
+
+
+async def _send_batch(batch: List[dict]):
+    if OUTBOX_DIGEST and len(batch) > 1:
+        leads = [d["payload"] for d in batch]
+        message = _build_message(f"{len(leads)} New Leads", _digest_html(leads), MAIL_FROM)
+        try:
+            await smtp_connection.send(message)
+        except Exception as e:
+            for document in batch:
+                await _mark_failed(document, e)
+            return
+        await _mark_sent(batch)
+        print(f"✅ Digest of {len(leads)} lead notifications sent to {MAIL_FROM}")
+        return
+
+    sent = []
+    for document in batch:
+        lead_data = document["payload"]
+        message = _build_message(
+            f"New Lead: {lead_data.get('name')} - {lead_data.get('interest')}",
+            _lead_html(lead_data),
+            MAIL_FROM,  # Send to the owner
         )
+        try:
+            await smtp_connection.send(message)
+            sent.append(document)
+        except Exception as e:
+            await _mark_failed(document, e)
+    if sent:
+        await _mark_sent(sent)
+        print(f"✅ {len(sent)} email notification(s) sent to {MAIL_FROM}")
 
-        fm = FastMail(conf)
-        await fm.send_message(message)
-        print(f"✅ Email notification sent to {MAIL_FROM}")
-    except Exception as e:
-        print(f"❌ Failed to send email: {e}")
+
+async def run_outbox_worker():
+    """
+    Long-running task started with the app: drains `email_outbox` in batches
+    over one SMTP connection, then sleeps until woken by a new lead or the
+    poll interval passes.
+    """
+    global _outbox_wakeup
+    if not is_email_configured():
+        print("⚠️ Email outbox worker not started: email is not configured")
+        return
+    _outbox_wakeup = asyncio.Event()
+
+    while True:
+        # Cleared before claiming, so a lead queued during the claim still wakes the next wait
+        _outbox_wakeup.clear()
+        try:
+            batch = await _claim_batch()
+            if batch:
+                await _send_batch(batch)
+                continue
+            await smtp_connection.close_if_idle()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Email outbox worker error: {e}")
+
+        try:
+            await asyncio.wait_for(_outbox_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
 
 async def send_test_email(to_email: str):
+    conf = get_mail_config()
     if not conf:
         raise Exception("Email configuration missing in .env")
-    
+
+    from fastapi_mail import FastMail, MessageSchema, MessageType
     message = MessageSchema(
         subject="Test Email from Ramdev Builders",
         recipients=[to_email],
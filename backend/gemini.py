@@ -0,0 +1,64 @@
+"""
+The Gemini consultant model, created on first use. Importing
+google.generativeai takes about a second, so it happens in a background
+thread after startup (see WARM_SDKS) or on the first chat, not while the
+app boots.
+"""
+import asyncio
+import threading
+
+from settings import settings
+
+MODEL_NAME = 'gemini-2.5-flash-lite'
+
+CONSULTANT_PROMPT = """
+You are 'RamdevAI', the Senior Design Consultant for Ramdev Builders & Developers.
+Your goal is to provide sophisticated, helpful advice on interior design, construction, and premium hardware.
+
+Guidelines:
+1. Tone: Professional, warm, and trustworthy.
+2. Expertise: Be knowledgeable about construction quality, foundations, and interior finishes.
+3. Lead Gen: ALWAYS goal is to get their contact details for a callback from Vinit Malviya.
+4. Context: You are talking to a potential client.
+"""
+
+_lock = threading.Lock()
+_model = None
+_loaded = False
+
+
+def is_configured() -> bool:
+    api_key = settings.gemini_api_key
+    return bool(api_key and api_key != "PASTE_YOUR_KEY_HERE")
+
+
+def get_model():
+    """
+    The GenerativeModel, or None without an API key (demo replies).
+    Blocking on the first call; safe from any thread.
+    """
+    global _model, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if is_configured():
+                    import google.generativeai as genai
+                    genai.configure(api_key=settings.gemini_api_key)
+                    # Sent as the system instruction, not repeated inside every user turn
+                    _model = genai.GenerativeModel(MODEL_NAME, system_instruction=CONSULTANT_PROMPT)
+                _loaded = True
+    return _model
+
+
+async def get_model_async():
+    """`get_model` for request handlers: a cold first load runs in a thread."""
+    if _loaded:
+        return _model
+    return await asyncio.to_thread(get_model)
+
+
+def set_model(model):
+    """Replaces the model (the benchmark's stand-in)."""
+    global _model, _loaded
+    with _lock:
+        _model, _loaded = model, True
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import orjson
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from circuit_breaker import CircuitOpen, mongo_breaker
+from database import DB
+from serialization import dumps
+from settings import settings
+
+# Append-only NDJSON file holding leads that couldn't be written to Mongo
+LEAD_SPOOL_PATH = settings.lead_spool_path
+# How long a lead insert may take before the lead is spooled instead
+LEAD_WRITE_TIMEOUT = settings.lead_write_timeout
+LEAD_SPOOL_REPLAY_BATCH = settings.lead_spool_replay_batch
+LEAD_SPOOL_REPLAY_INTERVAL = settings.lead_spool_replay_interval
+
+DUPLICATE_KEY = 11000
+
+
+def _encode(lead: dict) -> bytes:
+    return dumps(lead) + b"\n"
+
+
+def _decode(line: bytes) -> dict:
+    lead = orjson.loads(line)
+    lead["_id"] = ObjectId(lead["_id"])
+    if lead.get("created_at"):
+        lead["created_at"] = datetime.fromisoformat(lead["created_at"])
+    return lead
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    except FileNotFoundError:
+        return 0
+
+
+class LeadSpool:
+    """
+    Write-ahead file for leads while MongoDB is unreachable. Each lead is
+    appended as one JSON line and fsync'd before the request is answered,
+    so an accepted lead survives a crash. Leads carry their ObjectId from
+    the start, which makes replaying them idempotent: a lead whose original
+    insert did reach Mongo (e.g. after a timeout) is skipped as a duplicate.
+
+    Replay moves the file aside first (`<path>.replaying`), so new leads keep
+    being appended while a batch is written; the moved file is only deleted
+    once every lead in it is in Mongo. A lead Mongo rejects outright (e.g.
+    document validation) goes to `<path>.dead` rather than blocking the
+    leads behind it; fix it there and append it to the spool to retry.
+    """
+
+    def __init__(self, path: str = LEAD_SPOOL_PATH):
+        self.path = path
+        self.replay_path = path + ".replaying"
+        self.dead_letter_path = path + ".dead"
+        # Appends run in worker threads, the lock keeps lines whole and in order
+        self._lock = threading.Lock()
+        self._replay_lock = asyncio.Lock()
+        self._repair_tail()
+        self.pending = _count_lines(self.path) + _count_lines(self.replay_path)
+
+    def _repair_tail(self):
+        # A crash mid-append can leave a partial last line; end it so the next
+        # lead starts on a line of its own (replay skips the torn one)
+        try:
+            with open(self.path, "rb+") as f:
+                if f.seek(0, os.SEEK_END) == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        except FileNotFoundError:
+            pass
+
+    def _append(self, line: bytes):
+        with self._lock:
+            _append_synced(self.path, line)
+            self.pending += 1
+
+    async def append(self, lead: dict):
+        await asyncio.to_thread(self._append, _encode(lead))
+
+    def _take(self) -> Tuple[List[dict], int]:
+        """
+        Moves the spool aside (unless a previous replay left one) and reads
+        it. Returns the leads and the number of lines they came from.
+        """
+        with self._lock:
+            if not os.path.exists(self.replay_path):
+                if not os.path.exists(self.path):
+                    return [], 0
+                os.replace(self.path, self.replay_path)
+        leads, lines = [], 0
+        with open(self.replay_path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                lines += 1
+                try:
+                    leads.append(_decode(line))
+                except Exception as e:
+                    # A line torn by a crash mid-write; everything else is still replayed
+                    print(f"Lead spool: skipping unreadable line {number}: {e}")
+        return leads, lines
+
+    def _finish(self, count: int):
+        with self._lock:
+            os.remove(self.replay_path)
+            self.pending = max(self.pending - count, 0)
+
+    async def replay(self) -> int:
+        """
+        Writes spooled leads to Mongo in batches of LEAD_SPOOL_REPLAY_BATCH and
+        queues the email notification of every lead in a batch once it is
+        stored, duplicates included: the outbox is idempotent per lead id, and
+        a lead stored by an earlier, interrupted pass (or by a timed-out
+        save_lead) must still be notified. Returns how many leads were new.
+        Raises (keeping the file) if Mongo fails part way through, so the next
+        pass repeats both steps.
+        """
+        from email_service import send_lead_notification
+
+        async with self._replay_lock:
+            leads, lines = await asyncio.to_thread(self._take)
+            inserted = 0
+            for start in range(0, len(leads), LEAD_SPOOL_REPLAY_BATCH):
+                batch = leads[start:start + LEAD_SPOOL_REPLAY_BATCH]
+                new, rejected = await _insert_batch(batch)
+                inserted += new
+                for position, error in rejected.items():
+                    lead = batch[position]
+                    print(f"Lead spool: lead {lead['_id']} rejected by Mongo, moved to {self.dead_letter_path}: {error}")
+                    await asyncio.to_thread(_append_synced, self.dead_letter_path, _encode(lead))
+                for position, lead in enumerate(batch):
+                    if position not in rejected:
+                        await send_lead_notification(lead)
+            await asyncio.to_thread(self._finish, lines)
+
+        if leads:
+            print(f"Lead spool: replayed {len(leads)} leads ({inserted} new)")
+        return inserted
+
+
+def _append_synced(path: str, line: bytes):
+    with open(path, "ab") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def _insert_batch(batch: List[dict]) -> Tuple[int, Dict[int, str]]:
+    """
+    insert_many that tolerates leads already in Mongo. Returns how many were
+    new and the leads Mongo rejected for any other reason (position in
+    `batch` -> error): a per-document write error won't go away on retry.
+    Connection failures are raised, so the whole file is retried later.
+    """
+    try:
+        await mongo_breaker.call(lambda: DB.leads.insert_many(batch, ordered=False), LEAD_WRITE_TIMEOUT * 5)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        rejected = {}
+        for error in errors:
+            if error.get("code") != DUPLICATE_KEY:
+                rejected[error["index"]] = error.get("errmsg", "Write failed")
+        return len(batch) - len(errors), rejected
+    return len(batch), {}
+
+
+lead_spool = LeadSpool()
+
+
+async def save_lead(lead: dict) -> bool:
+    """
+    Inserts `lead` (which must already have its `_id`) into Mongo, or appends
+    it to the spool when the breaker is open, the connection fails or the
+    insert takes longer than LEAD_WRITE_TIMEOUT. Returns True if it went to
+    Mongo; other database errors are raised.
+    """
+    try:
+        await mongo_breaker.call(lambda: DB.leads.insert_one(lead), LEAD_WRITE_TIMEOUT)
+        return True
+    except CircuitOpen:
+        pass
+    except (ConnectionFailure, asyncio.TimeoutError) as e:
+        # Anything else (e.g. a validation error) would fail again on replay
+        print(f"Database unavailable, spooling lead: {e!r}")
+    await lead_spool.append(lead)
+    return False
+
+
+async def run_spool_replay(interval: float = LEAD_SPOOL_REPLAY_INTERVAL):
+    """
+    Long-running task started with the app: replays the spool whenever it
+    holds leads, including ones left over from before a restart.
+    """
+    while True:
+        if lead_spool.pending:
+            try:
+                await lead_spool.replay()
+            except asyncio.CancelledError:
+                raise
+            except CircuitOpen:
+                pass
+            except Exception as e:
+                print(f"Lead spool replay failed, retrying in {interval}s: {e!r}")
+        await asyncio.sleep(interval)
@@ -1,27 +1,43 @@
+from settings import settings  # first: reads .env and marks the process start for the startup report
 from fastapi import FastAPI, HTTPException, Form, Body, Depends, File, UploadFile, status, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-from database import DB
+import io
+import re
+import csv
+import json
+from database import DB, ensure_indexes
 from models import LeadCreate
 from datetime import datetime
 from pydantic import BaseModel
-from fastapi.staticfiles import StaticFiles
+from static_files import CachedStaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
-from auth import verify_password, create_access_token, get_password_hash, get_current_user, User
-from models import Token, PortfolioItem, PortfolioItemCreate, ProjectUpdateCreate
+from auth import bcrypt_stats, verify_password, create_access_token, get_password_hash, get_current_user, invalidate_user, password_needs_rehash, User
+from models import Token, PortfolioItem, PortfolioItemCreate, ProjectUpdateCreate, StageCreate, StageRename, StageOrder
 from bson import ObjectId
+from pymongo.errors import PyMongoError
 import shutil
 from typing import List, Optional
-from email_service import send_lead_notification, send_test_email
+from email_service import send_lead_notification, send_test_email, run_outbox_worker, smtp_connection
+from cache import catalog_cache, cached_json_response
+from upload_executor import UploadQueueFull, upload_executor
+from chat_cache import chat_response_cache, normalize_question
+from chat_sessions import append_turn, load_session, trim_history
+from pagination import fetch_page, parse_projection
+from serialization import dumps, find_documents, json_response
+from metrics import (METRICS_TOKEN, MetricsMiddleware, monitor_event_loop_lag, record_startup, register_gauge,
+                     render_metrics, startup_timings, timed)
+from gemini import get_model, get_model_async
+from circuit_breaker import mongo_breaker
+from lead_spool import lead_spool, run_spool_replay, save_lead
+from search_index import (SOURCES as SEARCH_SOURCES, index_search_document, refresh_search_document,
+                          refresh_search_documents, remove_search_document, run_search_index, search_index,
+                          wait_for_search_index)
+from project_stages import (add_stage, add_stage_images, apply_project_change, load_project, remove_stage,
+                            remove_stage_image, rename_stage, reorder_stages)
+import asyncio
 from pydantic import EmailStr
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-from cloudinary.utils import cloudinary_url
-
-load_dotenv()
 
 app = FastAPI(title="Ramdev Builders API")
 
@@ -33,30 +49,39 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-model = None
-if api_key and api_key != "PASTE_YOUR_KEY_HERE":
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
+@app.exception_handler(UploadQueueFull)
+async def upload_queue_full_handler(request: Request, exc: UploadQueueFull):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
 
 class ChatRequest(BaseModel):
     message: str
-    history: list = []  # List of {role: "user"|"model", parts: ["text"]}
+    session_id: Optional[str] = None  # Returned by the first reply, send it back to continue
+    history: list = []  # List of {role: "user"|"model", parts: ["text"]}, only used to seed a new session
 
-# Mount static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Mount static files (legacy local media, with cache headers and a small-file memory cache)
+app.mount("/uploads", CachedStaticFiles(directory="uploads"), name="uploads")
 
 @app.on_event("startup")
 async def startup_db_client():
     # Ensure uploads directory exists
     os.makedirs("uploads", exist_ok=True)
+
+    # Build indexes in the background so startup doesn't wait on Atlas
+    app.state.index_task = asyncio.create_task(ensure_indexes())
+    app.state.search_task = asyncio.create_task(run_search_index())
+    app.state.outbox_task = asyncio.create_task(run_outbox_worker())
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    # Replays leads spooled during a Mongo outage, including before a restart
+    app.state.spool_task = asyncio.create_task(run_spool_replay())
+    if settings.warm_sdks:
+        app.state.warm_task = asyncio.create_task(asyncio.to_thread(warm_sdks))
     
     # Create default admin user if not exists
     try:
         if await DB.users.count_documents({}) == 0:
-             hashed_password = get_password_hash("admin123")
+             hashed_password = await get_password_hash("admin123")
              user_dict = {"username": "admin", "password_hash": hashed_password, "role": "admin"}
              await DB.users.insert_one(user_dict)
              print("Admin user created: admin / admin123")
@@ -64,13 +89,44 @@ async def startup_db_client():
             # Check if admin exists specifically
             admin_user = await DB.users.find_one({"username": "admin"})
             if not admin_user:
-                hashed_password = get_password_hash("admin123")
+                hashed_password = await get_password_hash("admin123")
                 user_dict = {"username": "admin", "password_hash": hashed_password, "role": "admin"}
                 await DB.users.insert_one(user_dict)
                 print("Admin user created: admin / admin123")
     except Exception as e:
         print(f"DB Startup Error: {e}")
 
+    record_startup("startup_complete")
+    print("Startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in startup_timings.items()))
+
+def warm_sdks():
+    """
+    Imports and configures the Gemini, Cloudinary and mail SDKs in a worker
+    thread once the app is serving, so the first chat or upload doesn't pay
+    for it. Any failure is retried lazily on first use.
+    """
+    from cloudinary_service import configure_cloudinary
+    from email_service import get_mail_config
+
+    for name, warm in (("gemini", get_model), ("cloudinary", configure_cloudinary), ("mail", get_mail_config)):
+        try:
+            warm()
+        except Exception as e:
+            print(f"SDK warm-up failed for {name}: {e}")
+    print(f"SDKs warmed up {record_startup('sdks_warm'):.2f}s after process start")
+
+@app.on_event("shutdown")
+async def shutdown_upload_executor():
+    upload_executor.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_background_tasks():
+    for name in ("search_task", "outbox_task", "loop_lag_task", "spool_task", "warm_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    await smtp_connection.close()
+
 # --- API Routes ---
 
 @app.get("/")
@@ -80,35 +136,62 @@ async def root():
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await DB.users.find_one({"username": form_data.username})
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    if not user or not await verify_password(form_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Upgrade the stored hash when BCRYPT_ROUNDS has changed
+    if password_needs_rehash(user["password_hash"]):
+        new_hash = await get_password_hash(form_data.password)
+        await DB.users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+        invalidate_user(user["username"])
     access_token = create_access_token(data={"sub": user["username"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/reset-admin-password")
 async def reset_admin_password():
     # TEMPORARY ENDPOINT FOR RECOVERY
-    hashed_password = get_password_hash("admin123")
+    hashed_password = await get_password_hash("admin123")
     await DB.users.update_one(
         {"username": "admin"},
         {"$set": {"password_hash": hashed_password}},
         upsert=True
     )
+    invalidate_user("admin")
     return {"status": "success", "message": "Admin password reset to 'admin123'"}
 
-@app.get("/api/portfolio", response_model=List[dict])
-async def get_portfolio_items():
-    items = []
-    cursor = DB.portfolio.find()
-    async for document in cursor:
-        document["id"] = str(document["_id"])
-        del document["_id"]
-        items.append(document)
-    return items
+def catalog_cache_key(**params) -> str:
+    return "&".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
+
+@app.get("/api/portfolio")
+async def get_portfolio_items(
+    request: Request,
+    category: Optional[str] = None,
+    media_type: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Portfolio items in upload order, optionally filtered by category/media_type.
+    Without `limit` or `cursor` the whole (filtered) list is returned; with them
+    the response is a page `{items, next_cursor}` for infinite scroll.
+    """
+    query = {}
+    if category:
+        query["category"] = category
+    if media_type:
+        query["media_type"] = media_type
+
+    async def load_items():
+        if limit is None and cursor is None:
+            return await find_documents(DB.portfolio, query)
+        items, next_cursor = await fetch_page(DB.portfolio, query, "_id", limit, cursor, direction=1)
+        return {"items": items, "next_cursor": next_cursor}
+
+    key = catalog_cache_key(category=category, media_type=media_type, limit=limit, cursor=cursor)
+    return await cached_json_response(request, "portfolio", load_items, key)
 
 @app.post("/api/portfolio")
 async def create_portfolio_item(
@@ -131,7 +214,7 @@ async def create_portfolio_item(
     # Wait, I didn't import the helper yet? My bad.
     # Let's direct import here if I didn't update imports above perfectly.
     # Or just use the helper:
-    from cloudinary_service import upload_image_to_cloudinary
+    from cloudinary_service import media_variants, upload_image_to_cloudinary
     
     # Reset file cursor before upload, just in case
     await image.seek(0)
@@ -149,46 +232,143 @@ async def create_portfolio_item(
         "description": description,
         "size": size,
         "media_type": media_type,
-        "image_url": file_url # Now a full URL, not relative path
+        "image_url": file_url, # Now a full URL, not relative path
+        "image_variants": media_variants(file_url)
     }
     
     new_item = await DB.portfolio.insert_one(item_dict)
+    catalog_cache.invalidate("portfolio")
+    index_search_document("portfolio", item_dict)
     return {"status": "success", "id": str(new_item.inserted_id)}
 
 @app.delete("/api/portfolio/{item_id}")
 async def delete_portfolio_item(item_id: str, current_user: User = Depends(get_current_user)):
     result = await DB.portfolio.delete_one({"_id": ObjectId(item_id)})
+    catalog_cache.invalidate("portfolio")
+    remove_search_document("portfolio", item_id)
     if result.deleted_count == 1:
         return {"status": "success"}
     raise HTTPException(status_code=404, detail="Item not found")
 
 @app.post("/api/leads")
-async def create_lead(lead: LeadCreate, background_tasks: BackgroundTasks):
+async def create_lead(lead: LeadCreate):
+    lead_dict = lead.model_dump()
+    # Assigned here so a spooled lead keeps its id when it is replayed
+    lead_dict["_id"] = ObjectId()
     try:
-        lead_dict = lead.model_dump()
-        result = await DB.leads.insert_one(lead_dict)
-        
-        # Send email notification
-        background_tasks.add_task(send_lead_notification, lead_dict)
-        
-        return {"status": "success", "id": str(result.inserted_id), "message": "Inquiry received! We will call you shortly."}
-    except Exception as e:
+        stored = await save_lead(lead_dict)
+    except PyMongoError as e:
         print(f"Database Error: {e}")
-        return {"status": "demo_success", "message": "Demo: Lead received (DB not connected)"}
-
-@app.get("/api/leads", response_model=List[dict])
-async def get_leads(current_user: User = Depends(get_current_user)):
-    leads = []
-    # Sort by created_at descending (newest first)
-    cursor = DB.leads.find().sort("created_at", -1)
-    async for document in cursor:
-        document["id"] = str(document["_id"])
-        del document["_id"]
-        # Ensure created_at is handled correctly if it's a datetime object in DB
-        if "created_at" in document and isinstance(document["created_at"], datetime):
-             document["created_at"] = document["created_at"].isoformat()
-        leads.append(document)
-    return leads
+        raise HTTPException(status_code=500, detail="Database Error")
+    except Exception as e:
+        print(f"Lead could not be saved or spooled: {e}")
+        raise HTTPException(status_code=503, detail="Could not save your inquiry, please call us directly.")
+
+    # Queue the email notification; the outbox worker delivers it. Spooled
+    # leads are queued when they are replayed into Mongo.
+    if stored:
+        try:
+            await send_lead_notification(lead_dict)
+        except Exception as e:
+            print(f"Failed to queue lead notification: {e}")
+
+    return {"status": "success", "id": str(lead_dict["_id"]), "message": "Inquiry received! We will call you shortly."}
+
+LEAD_FIELDS = {"name", "phone", "email", "interest", "created_at"}
+
+@app.get("/api/leads")
+async def get_leads(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Newest leads first, one page at a time. Pass the returned `next_cursor`
+    back as `cursor` for the following page; it is null on the last page.
+    `fields` is an optional comma separated projection, e.g. `name,phone`.
+    """
+    projection = parse_projection(fields, LEAD_FIELDS, required=("created_at",))
+
+    # Sort by created_at descending (newest first), _id breaks ties
+    leads, next_cursor = await fetch_page(DB.leads, {}, "created_at", limit, cursor, projection)
+    return json_response({"items": leads, "next_cursor": next_cursor})
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_COLUMNS = ["id", "name", "phone", "email", "interest", "created_at"]
+
+# "+91 98765-43210": only digits, spaces and dashes can't carry a formula. Spaces
+# only, not \s: a leading tab or CR is itself one of the characters to escape.
+PLAIN_PHONE = re.compile(r"\+?[\d -]+")
+
+def csv_safe(value) -> str:
+    # Stop spreadsheet apps from evaluating cells like "=HYPERLINK(...)"
+    text = "" if value is None else str(value)
+    if text[:1] in ("=", "+", "-", "@", "\t", "\r") and not PLAIN_PHONE.fullmatch(text):
+        return "'" + text
+    return text
+
+@app.get("/api/leads/export")
+async def export_leads(
+    format: str = "csv",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    interest: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Streams leads (newest first) as CSV or NDJSON straight from the Mongo
+    cursor, EXPORT_BATCH_SIZE documents at a time, so memory use doesn't grow
+    with the number of leads. `since`/`until` filter on created_at.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+    query = {}
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+    if interest:
+        query["interest"] = interest
+
+    async def rows():
+        if format == "csv":
+            yield ",".join(EXPORT_COLUMNS) + "\r\n"
+        db_cursor = DB.leads.find(query).sort([("created_at", -1), ("_id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+        while True:
+            batch = await db_cursor.to_list(length=EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if format == "csv" else None
+            for document in batch:
+                created_at = document.get("created_at")
+                record = {
+                    "id": str(document["_id"]),
+                    "name": document.get("name"),
+                    "phone": document.get("phone"),
+                    "email": document.get("email"),
+                    "interest": document.get("interest"),
+                    "created_at": created_at,
+                }
+                if writer:
+                    if isinstance(created_at, datetime):
+                        record["created_at"] = created_at.isoformat()
+                    writer.writerow([csv_safe(record[c]) for c in EXPORT_COLUMNS])
+                else:
+                    buffer.write(dumps(record).decode("utf-8") + "\n")
+            yield buffer.getvalue()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"leads-{datetime.now():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @app.delete("/api/leads/{lead_id}")
 async def delete_lead(lead_id: str, current_user: User = Depends(get_current_user)):
@@ -197,6 +377,27 @@ async def delete_lead(lead_id: str, current_user: User = Depends(get_current_use
         return {"status": "success"}
     raise HTTPException(status_code=404, detail="Lead not found")
 
+register_gauge("upload_executor_tasks", "Cloudinary upload executor: pending, running and queued tasks.", ("state",),
+               lambda: {(state,): upload_executor.stats()[state] for state in ("pending", "running", "queued")})
+
+register_gauge("bcrypt_queue_depth", "Password hashes waiting for a bcrypt worker.", (),
+               lambda: {(): bcrypt_stats()["queued"]})
+register_gauge("mongo_circuit_open", "1 while the MongoDB circuit breaker is open or half-open.", (),
+               lambda: {(): 0 if mongo_breaker.state == "closed" else 1})
+register_gauge("lead_spool_pending", "Leads in the local spool waiting to be replayed into MongoDB.", (),
+               lambda: {(): lead_spool.pending})
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Prometheus text exposition of request, dependency and event-loop metrics."""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/admin/upload-stats")
+async def get_upload_stats(current_user: User = Depends(get_current_user)):
+    return upload_executor.stats()
+
 @app.post("/api/test-email")
 async def test_email_endpoint(email: EmailStr = Body(..., embed=True), background_tasks: BackgroundTasks = None):
     try:
@@ -214,7 +415,7 @@ async def create_hardware_product(
     image: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
-    from cloudinary_service import upload_image_to_cloudinary
+    from cloudinary_service import media_variants, upload_image_to_cloudinary
     
     # Reset file cursor
     await image.seek(0)
@@ -230,85 +431,235 @@ async def create_hardware_product(
         "description": description,
         "price": price,
         "tag": tag,
-        "image_url": file_url
+        "image_url": file_url,
+        "image_variants": media_variants(file_url)
     }
     
     new_product = await DB.hardware.insert_one(product_dict)
+    catalog_cache.invalidate("hardware")
+    index_search_document("hardware", product_dict)
     return {"status": "success", "id": str(new_product.inserted_id)}
 
 @app.get("/api/hardware")
-async def get_hardware_products():
-    products = []
-    cursor = DB.hardware.find()
-    async for document in cursor:
-        document["id"] = str(document["_id"])
-        del document["_id"]
-        products.append(document)
-    return products
+async def get_hardware_products(
+    request: Request,
+    tag: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Hardware products in upload order, optionally filtered by tag. Paginates
+    the same way as /api/portfolio when `limit` or `cursor` is given.
+    """
+    query = {"tag": tag} if tag else {}
+
+    async def load_products():
+        if limit is None and cursor is None:
+            return await find_documents(DB.hardware, query)
+        products, next_cursor = await fetch_page(DB.hardware, query, "_id", limit, cursor, direction=1)
+        return {"items": products, "next_cursor": next_cursor}
+
+    key = catalog_cache_key(tag=tag, limit=limit, cursor=cursor)
+    return await cached_json_response(request, "hardware", load_products, key)
+
+@app.post("/api/hardware/bulk-import")
+async def bulk_import_hardware(
+    manifest: UploadFile = File(...),
+    images: Optional[UploadFile] = File(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Imports many products at once from a CSV/JSON manifest plus a zip of the
+    images it references. See bulk_import.import_hardware_catalog.
+    """
+    from bulk_import import import_hardware_catalog
+
+    result = await import_hardware_catalog(manifest, images)
+    if result["inserted"]:
+        catalog_cache.invalidate("hardware")
+        await refresh_search_documents("hardware", [row["id"] for row in result["rows"] if row["status"] == "inserted"])
+    return result
 
 @app.delete("/api/hardware/{product_id}")
 async def delete_hardware_product(product_id: str, current_user: User = Depends(get_current_user)):
     result = await DB.hardware.delete_one({"_id": ObjectId(product_id)})
+    catalog_cache.invalidate("hardware")
+    remove_search_document("hardware", product_id)
     if result.deleted_count == 1:
         return {"status": "success"}
     raise HTTPException(status_code=404, detail="Product not found")
 
+def demo_chat_reply(message: str) -> str:
+    # Demo Fallback if no API Key
+    msg_lower = message.lower()
+    if "price" in msg_lower or "cost" in msg_lower:
+        return "For accurate pricing, we recommend a site visit. But to give you an idea, premium living room renovations start at ₹1200/sq.ft. Shall I book a visit?"
+    return "[DEMO] I need a Gemini API Key to think! Please add it to backend/.env."
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
-    # Demo Fallback if no API Key
+    session_id, history = await load_session(request.session_id, request.history)
+    model = await get_model_async()
     if not model:
-        msg_lower = request.message.lower()
-        if "price" in msg_lower or "cost" in msg_lower:
-            return {"response": "For accurate pricing, we recommend a site visit. But to give you an idea, premium living room renovations start at ₹1200/sq.ft. Shall I book a visit?"}
-        return {"response": "[DEMO] I need a Gemini API Key to think! Please add it to backend/.env."}
+        return {"response": demo_chat_reply(request.message), "session_id": session_id}
+
+    # Cached replies only fit an opening question, later turns depend on the conversation
+    cache_key = None if history else normalize_question(request.message)
+    reply = chat_response_cache.get(cache_key) if cache_key else None
+
+    if reply is None:
+        try:
+            # The async client keeps the event loop free during the Gemini round trip
+            chat_session = model.start_chat(history=trim_history(history))
+            with timed("gemini", "generate"):
+                response = await chat_session.send_message_async(request.message)
+            reply = response.text
+        except Exception as e:
+            print(f"AI Error: {e}")
+            raise HTTPException(status_code=500, detail="AI Service Error")
+        if cache_key:
+            chat_response_cache.set(cache_key, reply)
+
+    await append_turn(session_id, history, request.message, reply)
+    return {"response": reply, "session_id": session_id}
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same as /api/chat but sends the reply as Server-Sent Events while Gemini
+    generates it: `event: session` with the session id first, then
+    `data: {"text": ...}` per chunk, then `event: done`.
+    Failures after the stream has started arrive as `event: error`.
+    """
+    session_id, history = await load_session(request.session_id, request.history)
+
+    async def events():
+        yield sse_event({"session_id": session_id}, event="session")
+        model = await get_model_async()
+        if not model:
+            yield sse_event({"text": demo_chat_reply(request.message)})
+            yield sse_event({}, event="done")
+            return
+
+        cache_key = None if history else normalize_question(request.message)
+        cached = chat_response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            yield sse_event({"text": cached})
+            await append_turn(session_id, history, request.message, cached)
+            yield sse_event({}, event="done")
+            return
+
+        parts = []
+        try:
+            chat_session = model.start_chat(history=trim_history(history))
+            # "stream_start" is the wait before Gemini starts answering, "stream" the whole reply
+            with timed("gemini", "stream"):
+                with timed("gemini", "stream_start"):
+                    response = await chat_session.send_message_async(request.message, stream=True)
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. safety metadata only)
+                        continue
+                    if text:
+                        parts.append(text)
+                        yield sse_event({"text": text})
+        except Exception as e:
+            print(f"AI Stream Error: {e}")
+            yield sse_event({"detail": "AI Service Error"}, event="error")
+            return
+        # Only complete replies are cached or kept in the session
+        if parts:
+            reply = "".join(parts)
+            if cache_key:
+                chat_response_cache.set(cache_key, reply)
+            await append_turn(session_id, history, request.message, reply)
+        yield sse_event({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies (nginx, Render) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    try:
-        # Improved System Prompt
-        system_instruction = """
-        You are 'RamdevAI', the Senior Design Consultant for Ramdev Builders & Developers. 
-        Your goal is to provide sophisticated, helpful advice on interior design, construction, and premium hardware.
-        
-        Guidelines:
-        1. Tone: Professional, warm, and trustworthy. 
-        2. Expertise: Be knowledgeable about construction quality, foundations, and interior finishes.
-        3. Lead Gen: ALWAYS goal is to get their contact details for a callback from Vinit Malviya.
-        4. Context: You are talking to a potential client.
-        """
-        
-        # Start chat with history (simplified)
-        # Note: In a real app, history should be formatted correctly for Gemini (user/model roles)
-        # We will start a fresh chat for this turn but inject history as context if needed.
-        # For simplicity/robustness in this turns:
-        
-        chat_session = model.start_chat(history=[])
-        response = chat_session.send_message(f"{system_instruction}\n\nClient: {request.message}")
-        
-        return {"response": response.text}
-    except Exception as e:
-        print(f"AI Error: {e}")
-        raise HTTPException(status_code=500, detail="AI Service Error")
+@app.get("/api/admin/chat-cache")
+async def get_chat_cache(entries: bool = False, current_user: User = Depends(get_current_user)):
+    stats = chat_response_cache.stats()
+    if entries:
+        stats["entries_list"] = [
+            {"question": key, "response": value, "expires_in": int(expires_in)}
+            for key, value, expires_in in reversed(chat_response_cache.items())
+        ]
+    return stats
+
+@app.delete("/api/admin/chat-cache")
+async def purge_chat_cache(question: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """
+    Purges the whole chat cache, or only the entry matching `question`
+    (normalized the same way incoming messages are).
+    """
+    if question:
+        removed = 0 if chat_response_cache.pop(normalize_question(question)) is None else 1
+    else:
+        removed = chat_response_cache.clear()
+    return {"status": "success", "removed": removed}
 
 # --- Project Updates Endpoints ---
-@app.get("/api/project-updates", response_model=List[dict])
-async def get_project_updates():
-    updates = []
-    cursor = DB.project_updates.find()
-    async for document in cursor:
-        document["id"] = str(document["_id"])
-        del document["_id"]
-        if "updated_at" in document and isinstance(document["updated_at"], datetime):
-            document["updated_at"] = document["updated_at"].isoformat()
-        updates.append(document)
-    return updates
+async def upload_project_media(form, log_prefix: str):
+    """
+    Uploads the `main_image` and `stage_images_<stage>` files of a project
+    update form concurrently. Stage images keep the order they were sent in.
+    Returns (main_image_url, {stage_name: [urls]}, failed_uploads).
+    """
+    from cloudinary_service import upload_many
+
+    files = []
+    for key, value in form.multi_items():
+        if hasattr(value, 'read') and getattr(value, 'filename', None):
+            if key == "main_image" or key.startswith("stage_images_"):
+                files.append((key, value))
+    print(f"{log_prefix} Uploading {len(files)} files: {[k for k, v in files]}")
+
+    results = await upload_many([value for key, value in files], folder="ramdev_tracker")
+
+    main_image_url = ""
+    stage_images_dict = {}
+    failed_uploads = []
+    for (key, value), (url, error) in zip(files, results):
+        if error:
+            print(f"{log_prefix} Error uploading file for {key}: {error}")
+            failed_uploads.append({"field": key, "filename": value.filename, "error": error})
+        elif key == "main_image":
+            main_image_url = url
+        else:
+            stage_name = key[len("stage_images_"):]
+            stage_images_dict.setdefault(stage_name, []).append(url)
+    return main_image_url, stage_images_dict, failed_uploads
+
+def project_media_variants(main_image: str, stages: list) -> list:
+    from cloudinary_service import media_variant_list
+
+    urls = [main_image] + [url for stage in stages for url in stage.get("images", [])]
+    return media_variant_list([url for url in urls if url])
+
+@app.get("/api/project-updates")
+async def get_project_updates(request: Request):
+    async def load_updates():
+        return await find_documents(DB.project_updates)
+
+    return await cached_json_response(request, "project_updates", load_updates)
 
 @app.post("/api/project-updates")
 async def create_project_update(
     request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    import json
-    from cloudinary_service import upload_image_to_cloudinary
-
     form = await request.form()
     site_name = form.get("site_name")
     client_name = form.get("client_name", "")
@@ -331,34 +682,7 @@ async def create_project_update(
     except Exception as e:
         print(f"Error parsing work stages: {e}")
 
-    main_image_url = ""
-    stage_images_dict = {}
-
-    form_items = list(form.multi_items())
-    print(f"[POST] Total form keys received: {[k for k,v in form_items]}")
-
-    for key, value in form_items:
-        if hasattr(value, 'read') and getattr(value, 'filename', None):
-            print(f"[POST] Uploading file: key={key}, filename={value.filename}")
-            try:
-                if key == "main_image":
-                    await value.seek(0)
-                    url = await upload_image_to_cloudinary(value, folder="ramdev_tracker")
-                    print(f"[POST] main_image upload result: {url}")
-                    if url:
-                        main_image_url = url
-                elif key.startswith("stage_images_"):
-                    stage_name = key[len("stage_images_"):]
-                    print(f"[POST] Uploading stage image for stage: '{stage_name}'")
-                    await value.seek(0)
-                    url = await upload_image_to_cloudinary(value, folder="ramdev_tracker")
-                    print(f"[POST] stage image upload result: {url}")
-                    if url:
-                        if stage_name not in stage_images_dict:
-                            stage_images_dict[stage_name] = []
-                        stage_images_dict[stage_name].append(url)
-            except Exception as e:
-                print(f"[POST] Error uploading file for {key}: {e}")
+    main_image_url, stage_images_dict, failed_uploads = await upload_project_media(form, "[POST]")
 
     print(f"[POST] stage_images_dict keys: {list(stage_images_dict.keys())}")
     print(f"[POST] stages names: {[s['name'] for s in stages]}")
@@ -379,10 +703,14 @@ async def create_project_update(
             "category": category,
             "main_image": main_image_url,
             "work_stages": stages,
-            "updated_at": datetime.now()
+            "media_variants": project_media_variants(main_image_url, stages),
+            "updated_at": datetime.now(),
+            "version": 1
         }
         result = await DB.project_updates.insert_one(update_dict)
-        return {"status": "success", "id": str(result.inserted_id)}
+        catalog_cache.invalidate("project_updates")
+        index_search_document("project_updates", update_dict)
+        return {"status": "success", "id": str(result.inserted_id), "version": 1, "failed_uploads": failed_uploads}
     except Exception as e:
         print(f"Error creating project update: {e}")
         raise HTTPException(status_code=500, detail="Database Error")
@@ -393,9 +721,6 @@ async def update_project_update(
     request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    import json
-    from cloudinary_service import upload_image_to_cloudinary
-
     form = await request.form()
     site_name = form.get("site_name")
     client_name = form.get("client_name", "")
@@ -419,34 +744,19 @@ async def update_project_update(
     except Exception as e:
         print(f"Error parsing work stages: {e}")
 
-    main_image_url = existing_main_image
-    stage_images_dict = {}
-
-    form_items = list(form.multi_items())
-    print(f"[PUT] Total form keys received: {[k for k,v in form_items]}")
+    # `version` is optional here so older clients keep working (last write wins)
+    version = form.get("version") or None
+    if version is not None:
+        try:
+            version = int(version)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="version must be an integer")
+    # Fail a missing or stale update before spending time on Cloudinary uploads;
+    # the write below re-checks the version
+    await load_project(update_id, version)
 
-    for key, value in form_items:
-        if hasattr(value, 'read') and getattr(value, 'filename', None):
-            print(f"[PUT] Uploading file: key={key}, filename={value.filename}")
-            try:
-                if key == "main_image":
-                    await value.seek(0)
-                    url = await upload_image_to_cloudinary(value, folder="ramdev_tracker")
-                    print(f"[PUT] main_image upload result: {url}")
-                    if url:
-                        main_image_url = url
-                elif key.startswith("stage_images_"):
-                    stage_name = key[len("stage_images_"):]
-                    print(f"[PUT] Uploading stage image for stage: '{stage_name}'")
-                    await value.seek(0)
-                    url = await upload_image_to_cloudinary(value, folder="ramdev_tracker")
-                    print(f"[PUT] stage image upload result: {url}")
-                    if url:
-                        if stage_name not in stage_images_dict:
-                            stage_images_dict[stage_name] = []
-                        stage_images_dict[stage_name].append(url)
-            except Exception as e:
-                print(f"[PUT] Error uploading file for {key}: {e}")
+    uploaded_main_image, stage_images_dict, failed_uploads = await upload_project_media(form, "[PUT]")
+    main_image_url = uploaded_main_image or existing_main_image
 
     print(f"[PUT] stage_images_dict keys: {list(stage_images_dict.keys())}")
     print(f"[PUT] stages names: {[s['name'] for s in stages]}")
@@ -459,32 +769,106 @@ async def update_project_update(
         else:
             print(f"[PUT] No new images for stage '{name}'")
 
-    try:
-        update_dict = {
-            "site_name": site_name,
-            "client_name": client_name,
-            "location": location,
-            "category": category,
-            "main_image": main_image_url,
-            "work_stages": stages,
-            "updated_at": datetime.now()
-        }
-        
-        result = await DB.project_updates.update_one(
-            {"_id": ObjectId(update_id)},
-            {"$set": update_dict}
-        )
-        if result.matched_count == 1:
-            return {"status": "success"}
-        raise HTTPException(status_code=404, detail="Update not found")
-    except Exception as e:
-        print(f"Error updating project update: {e}")
-        raise HTTPException(status_code=500, detail="Database Error")
+    update_dict = {
+        "site_name": site_name,
+        "client_name": client_name,
+        "location": location,
+        "category": category,
+        "main_image": main_image_url,
+        "work_stages": stages,
+        "media_variants": project_media_variants(main_image_url, stages),
+    }
+    new_version = await apply_project_change(update_id, version, {"$set": update_dict})
+    await refresh_search_document("project_updates", update_id)
+    return {"status": "success", "version": new_version, "failed_uploads": failed_uploads}
+
+# Incremental edits: each request carries only the change and is applied with a
+# single $push/$pull/$set, so two admins editing different stages don't collide.
+@app.post("/api/project-updates/{update_id}/stages")
+async def create_project_stage(update_id: str, stage: StageCreate, current_user: User = Depends(get_current_user)):
+    version = await add_stage(update_id, stage.name, stage.version)
+    return {"status": "success", "version": version}
+
+@app.patch("/api/project-updates/{update_id}/stages/{stage_name}")
+async def rename_project_stage(update_id: str, stage_name: str, stage: StageRename,
+                               current_user: User = Depends(get_current_user)):
+    version = await rename_stage(update_id, stage_name, stage.name, stage.version)
+    return {"status": "success", "version": version}
+
+@app.delete("/api/project-updates/{update_id}/stages/{stage_name}")
+async def delete_project_stage(update_id: str, stage_name: str, version: Optional[int] = None,
+                               current_user: User = Depends(get_current_user)):
+    version = await remove_stage(update_id, stage_name, version)
+    return {"status": "success", "version": version}
+
+@app.put("/api/project-updates/{update_id}/stage-order")
+async def reorder_project_stages(update_id: str, stage_order: StageOrder, current_user: User = Depends(get_current_user)):
+    version = await reorder_stages(update_id, stage_order.order, stage_order.version)
+    return {"status": "success", "version": version}
+
+@app.post("/api/project-updates/{update_id}/stages/{stage_name}/images")
+async def add_project_stage_images(
+    update_id: str,
+    stage_name: str,
+    files: List[UploadFile] = File(...),
+    version: Optional[int] = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    from cloudinary_service import upload_many
+
+    # Fail fast on a stale version or unknown stage before uploading anything
+    await load_project(update_id, version, stage_name)
+    results = await upload_many(files, folder="ramdev_tracker")
+    urls = [url for url, error in results if not error]
+    failed_uploads = [
+        {"filename": file.filename, "error": error}
+        for file, (url, error) in zip(files, results) if error
+    ]
+    if not urls:
+        raise HTTPException(status_code=502, detail={"message": "No image could be uploaded", "failed_uploads": failed_uploads})
+    version = await add_stage_images(update_id, stage_name, urls, version)
+    return {"status": "success", "version": version, "images": urls, "failed_uploads": failed_uploads}
+
+@app.delete("/api/project-updates/{update_id}/stages/{stage_name}/images")
+async def delete_project_stage_image(update_id: str, stage_name: str, url: str, version: Optional[int] = None,
+                                     current_user: User = Depends(get_current_user)):
+    version = await remove_stage_image(update_id, stage_name, url, version)
+    return {"status": "success", "version": version}
 
 @app.delete("/api/project-updates/{update_id}")
 async def delete_project_update(update_id: str, current_user: User = Depends(get_current_user)):
     result = await DB.project_updates.delete_one({"_id": ObjectId(update_id)})
+    catalog_cache.invalidate("project_updates")
+    remove_search_document("project_updates", update_id)
     if result.deleted_count == 1:
         return {"status": "success"}
     raise HTTPException(status_code=404, detail="Update not found")
 
+SEARCH_MAX_LIMIT = 100
+# How long a search right after startup waits for the first index build
+SEARCH_BUILD_WAIT = 10
+
+@app.get("/api/search")
+async def search(q: str, type: Optional[str] = None, limit: int = 20):
+    """
+    Searches portfolio items, hardware products and project updates by
+    title/scope/description/name/site_name/location. Every word of `q` must
+    match a word or the start of one ("kitch cab" finds "Kitchen Cabinets").
+    `type` is an optional comma separated subset of portfolio, hardware and
+    project_updates; `facets.type` has the match count per type regardless.
+    """
+    kinds = None
+    if type:
+        kinds = [kind.strip() for kind in type.split(",") if kind.strip()]
+        unknown = set(kinds) - set(SEARCH_SOURCES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown type: {', '.join(sorted(unknown))}")
+    if len(q) > 200:
+        raise HTTPException(status_code=400, detail="q is too long")
+    try:
+        await wait_for_search_index(SEARCH_BUILD_WAIT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Search index is not available yet", headers={"Retry-After": "5"})
+    return json_response(search_index.search(q, kinds, max(1, min(limit, SEARCH_MAX_LIMIT))))
+
+record_startup("app_loaded")
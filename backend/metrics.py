@@ -0,0 +1,229 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+from settings import PROCESS_STARTED, settings
+
+# Optional bearer token for /metrics; unset means the endpoint is open (scrapers usually are)
+METRICS_TOKEN = settings.metrics_token
+# How often the event-loop lag probe wakes up
+LOOP_LAG_INTERVAL = settings.metrics_loop_lag_interval
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., sum, count]
+        self._values: Dict[tuple, list] = {}
+        # Observed from executor threads (uploads) as well as the event loop
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Read when scraped, from a callback returning {label values: value}."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], collect: Callable[[], Dict[tuple, float]]):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.collect()
+        except Exception as e:
+            print(f"Metrics gauge {self.name} failed: {e}")
+            values = {}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+# Seconds from process start (settings import) to each startup milestone
+startup_timings: Dict[str, float] = {}
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status"))
+http_latency = Histogram(
+    "http_request_duration_seconds", "Time until the last body chunk was sent.", ("method", "route"))
+dependency_latency = Histogram(
+    "dependency_duration_seconds", "Calls to MongoDB, Cloudinary, Gemini and SMTP.", ("dependency", "operation"))
+dependency_errors = Counter(
+    "dependency_errors_total", "Failed calls to MongoDB, Cloudinary, Gemini and SMTP.", ("dependency", "operation"))
+loop_lag = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer scheduled every interval.", (), LAG_BUCKETS)
+
+REGISTRY: List = [
+    http_requests, http_latency, dependency_latency, dependency_errors, loop_lag,
+    Gauge("startup_seconds", "Seconds from process start to each startup milestone.", ("phase",),
+          lambda: {(phase,): round(seconds, 4) for phase, seconds in startup_timings.items()}),
+]
+
+
+def record_startup(phase: str) -> float:
+    """Records `phase` the first time it is reached; returns its offset."""
+    if phase not in startup_timings:
+        startup_timings[phase] = time.perf_counter() - PROCESS_STARTED
+    return startup_timings[phase]
+
+
+def register_gauge(name: str, help_text: str, labels: Tuple[str, ...], collect: Callable[[], Dict[tuple, float]]):
+    REGISTRY.append(Gauge(name, help_text, labels, collect))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def timed(dependency: str, operation: str):
+    """
+    Records the duration of the enclosed block in dependency_duration_seconds
+    and counts exceptions in dependency_errors_total. Works in threads too.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+            dependency_errors.inc(dependency, operation)
+        raise
+    finally:
+        dependency_latency.observe(time.perf_counter() - started, dependency, operation)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    pymongo command listener: times every command Motor sends (find,
+    aggregate, insert, ...) from the driver's own measurements.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        dependency_latency.observe(event.duration_micros / 1e6, "mongodb", event.command_name)
+
+    def failed(self, event):
+        dependency_latency.observe(event.duration_micros / 1e6, "mongodb", event.command_name)
+        dependency_errors.inc("mongodb", event.command_name)
+
+
+def _route_template(scope, root_path: str) -> str:
+    # The matched template ("/api/portfolio/{item_id}"), never the raw path,
+    # so ids don't turn into separate series
+    path = getattr(scope.get("route"), "path", None)
+    if path is not None:
+        return path
+    # Mounted apps (/uploads) don't set a route, but routing extends root_path
+    mount = scope.get("root_path", "")[len(root_path):]
+    return f"{mount}/*" if mount else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count, status and latency per route.
+    Latency runs until the last body chunk, so streamed responses (SSE chat,
+    lead exports) are measured in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if "first_request" not in startup_timings:
+                record_startup("first_request")
+            route = _route_template(scope, root_path)
+            http_requests.inc(scope["method"], route, str(status["code"]))
+            http_latency.observe(time.perf_counter() - started, scope["method"], route)
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """
+    Sleeps `interval` in a loop; the time beyond that is how long other
+    callbacks kept the loop busy (blocking calls, heavy CPU work).
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(loop.time() - started - interval, 0.0))
@@ -1,93 +1,277 @@
+"""
+Moves legacy /uploads/ media to Cloudinary and rewrites the URLs in MongoDB.
+
+    python migrate_to_cloudinary.py [--dry-run] [--concurrency 8]
+                                    [--collections portfolio,hardware,project_updates]
+                                    [--checkpoint .migration_checkpoint.ndjson]
+                                    [--backfill-variants]
+
+Covers portfolio.image_url, hardware.image_url, project_updates.main_image
+and project_updates.work_stages[].images[]. Every finished upload is appended
+to the checkpoint journal, so an interrupted run can be started again: files
+already uploaded are not sent twice, documents already rewritten are skipped.
+
+--backfill-variants only adds the responsive image URLs (image_variants /
+media_variants) to documents whose media is already on Cloudinary; it makes
+no API calls.
+"""
+import argparse
 import asyncio
+import json
+import mimetypes
 import os
-import cloudinary
-import cloudinary.uploader
+import threading
+import time
 from database import DB
-from dotenv import load_dotenv
+from settings import settings
+from cloudinary_service import (LARGE_UPLOAD_THRESHOLD, UPLOAD_CHUNK_SIZE, _resource_type, configure_cloudinary,
+                                media_variant_list, media_variants)
+from upload_executor import UploadExecutor
+
+FOLDERS = {
+    "portfolio": "ramdev_portfolio",
+    "hardware": "ramdev_hardware",
+    "project_updates": "ramdev_tracker",
+}
+
+
+def local_media_fields(collection: str, item: dict):
+    """
+    Yields (field_path, url) for every /uploads/ URL in a document. Field
+    paths use Mongo dot notation so each one can be updated on its own.
+    """
+    if collection in ("portfolio", "hardware"):
+        url = item.get("image_url") or ""
+        if url.startswith("/uploads/"):
+            yield "image_url", url
+    elif collection == "project_updates":
+        url = item.get("main_image") or ""
+        if url.startswith("/uploads/"):
+            yield "main_image", url
+        for i, stage in enumerate(item.get("work_stages") or []):
+            if not isinstance(stage, dict):
+                continue
+            for j, url in enumerate(stage.get("images") or []):
+                if isinstance(url, str) and url.startswith("/uploads/"):
+                    yield f"work_stages.{i}.images.{j}", url
+
+
+def upload_path(file_path: str, folder: str) -> dict:
+    # Blocking; runs on the migration's UploadExecutor threads
+    uploader = configure_cloudinary()
+    # Same rule as request uploads: legacy videos must be sent as "video" to the chunked API
+    resource_type = _resource_type(mimetypes.guess_type(file_path)[0])
+    if os.path.getsize(file_path) > LARGE_UPLOAD_THRESHOLD:
+        return uploader.upload_large(
+            file_path, folder=folder, resource_type=resource_type, chunk_size=UPLOAD_CHUNK_SIZE
+        )
+    return uploader.upload(file_path, folder=folder, resource_type=resource_type)
+
+
+class Checkpoint:
+    """
+    Local URL -> Cloudinary URL for every upload that already finished, kept
+    in an append-only NDJSON journal: each upload adds one line instead of
+    rewriting the whole map, and the write runs in a worker thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = {}
+        # Appends run in worker threads, the lock keeps lines whole
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            lines = f.read().splitlines(keepends=True)
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line torn by a crash mid-write; that file is uploaded again
+                continue
+            if "local_url" in entry:
+                self.done[entry["local_url"]] = entry["secure_url"]
+            else:
+                # Checkpoints written before the journal are one JSON object
+                self.done.update(entry)
+        if lines and not lines[-1].endswith(b"\n"):
+            # End the torn line so the next entry starts on a line of its own
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+
+    def _append(self, line: bytes):
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def record(self, local_url: str, secure_url: str):
+        self.done[local_url] = secure_url
+        line = json.dumps({"local_url": local_url, "secure_url": secure_url}).encode() + b"\n"
+        await asyncio.to_thread(self._append, line)
+
+
+class Migration:
+    def __init__(self, dry_run: bool, concurrency: int, checkpoint: Checkpoint):
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.executor = UploadExecutor(workers=concurrency, max_pending=concurrency)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Two documents can point at the same file; upload it once
+        self.in_flight = {}
+        self.stats = {"scanned": 0, "files": 0, "migrated": 0, "resumed": 0, "missing": 0, "errors": 0, "bytes": 0}
+
+    async def cloudinary_url_for(self, local_url: str, folder: str):
+        if local_url in self.in_flight:
+            return await self.in_flight[local_url]
+        if local_url in self.checkpoint.done:
+            self.stats["resumed"] += 1
+            return self.checkpoint.done[local_url]
+        self.in_flight[local_url] = asyncio.ensure_future(self._upload(local_url, folder))
+        return await self.in_flight[local_url]
+
+    async def _upload(self, local_url: str, folder: str):
+        file_path = os.path.join("uploads", local_url[len("/uploads/"):])
+        if not os.path.exists(file_path):
+            print(f"   ⚠️  File not found locally: {file_path}")
+            self.stats["missing"] += 1
+            return None
 
-load_dotenv()
+        size = os.path.getsize(file_path)
+        if self.dry_run:
+            print(f"   [dry-run] would upload {file_path} ({size / 1024:.0f} KB) to {folder}")
+            self.stats["bytes"] += size
+            return None
 
-# Configure Cloudinary
-cloudinary.config( 
-  cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"), 
-  api_key = os.getenv("CLOUDINARY_API_KEY"), 
-  api_secret = os.getenv("CLOUDINARY_API_SECRET"),
-  secure = True
-)
+        try:
+            response = await self.executor.run(upload_path, file_path, folder)
+        except Exception as e:
+            print(f"   ❌ Error uploading {file_path}: {e}")
+            self.stats["errors"] += 1
+            return None
+
+        secure_url = response.get("secure_url")
+        if not secure_url:
+            print(f"   ❌ Upload failed: No URL returned for {file_path}")
+            self.stats["errors"] += 1
+            return None
+        await self.checkpoint.record(local_url, secure_url)
+        self.stats["bytes"] += size
+        print(f"   ⬆️  {file_path} -> {secure_url}")
+        return secure_url
+
+    async def migrate_field(self, collection: str, item_id, field: str, local_url: str):
+        async with self.semaphore:
+            secure_url = await self.cloudinary_url_for(local_url, FOLDERS[collection])
+        if not secure_url or self.dry_run:
+            return
+        # Only rewrite if the field still holds the local URL (no concurrent edit)
+        update = {"$set": {field: secure_url}}
+        if field == "image_url":
+            update["$set"]["image_variants"] = media_variants(secure_url)
+        else:
+            update["$addToSet"] = {"media_variants": {"$each": media_variant_list([secure_url])}}
+        result = await DB[collection].update_one({"_id": item_id, field: local_url}, update)
+        if result.modified_count:
+            self.stats["migrated"] += 1
+
+    async def run(self, collections):
+        tasks = []
+        for collection in collections:
+            async for item in DB[collection].find():
+                self.stats["scanned"] += 1
+                for field, url in local_media_fields(collection, item):
+                    self.stats["files"] += 1
+                    tasks.append(asyncio.ensure_future(
+                        self.migrate_field(collection, item["_id"], field, url)
+                    ))
+        await asyncio.gather(*tasks)
+        self.executor.shutdown()
+
+
+def document_variants(collection: str, item: dict) -> dict:
+    # Same fields the upload endpoints fill in
+    if collection in ("portfolio", "hardware"):
+        return {"image_variants": media_variants(item.get("image_url"))}
+    urls = [item.get("main_image")]
+    for stage in item.get("work_stages") or []:
+        if isinstance(stage, dict):
+            urls.extend(stage.get("images") or [])
+    return {"media_variants": media_variant_list([url for url in urls if isinstance(url, str) and url])}
+
+
+async def backfill_variants(collections, dry_run: bool = False):
+    """
+    Stores responsive variant URLs on documents created before they existed.
+    Variants are computed locally, so this is cheap to re-run.
+    """
+    updated = 0
+    for collection in collections:
+        async for item in DB[collection].find():
+            variants = document_variants(collection, item)
+            if all(item.get(key) == value for key, value in variants.items()):
+                continue
+            updated += 1
+            if dry_run:
+                print(f"   [dry-run] would add variants to {collection} {item['_id']}")
+            else:
+                await DB[collection].update_one({"_id": item["_id"]}, {"$set": variants})
+    print(f"Variants {'to add' if dry_run else 'added'}: {updated} documents")
+
+
+async def migrate_images(dry_run: bool = False, concurrency: int = 4,
+                         collections=tuple(FOLDERS), checkpoint_path: str = ".migration_checkpoint.ndjson"):
+    print("🚀 Starting migration of local uploads to Cloudinary..." + (" (dry run)" if dry_run else ""))
 
-async def migrate_images():
-    print("🚀 Starting migration of local uploads to Cloudinary...")
-    
     # Verify Cloudinary config
-    if not os.getenv("CLOUDINARY_CLOUD_NAME"):
+    if not dry_run and not settings.cloudinary_cloud_name:
         print("❌ Cloudinary credentials missing in .env")
         return
 
-    count = 0
-    updated = 0
-    errors = 0
-
-    cursor = DB.portfolio.find()
-    async for item in cursor:
-        original_url = item.get("image_url", "")
-        
-        # Check if it's a local file (starts with /uploads/)
-        if original_url.startswith("/uploads/"):
-            filename = original_url.replace("/uploads/", "")
-            file_path = os.path.join("uploads", filename)
-            
-            print(f"📦 Processing: {item.get('title')} ({filename})")
-            
-            if os.path.exists(file_path):
-                try:
-                    # Determine resource type based on extension just in case, or let Cloudinary auto-detect
-                    # Cloudinary auto usually works well.
-                    
-                    print(f"   ⬆️  Uploading to Cloudinary...")
-                    response = cloudinary.uploader.upload(
-                        file_path, 
-                        folder="ramdev_portfolio",
-                        resource_type="auto"
-                    )
-                    
-                    secure_url = response.get("secure_url")
-                    
-                    if secure_url:
-                        # Update MongoDB document
-                        await DB.portfolio.update_one(
-                            {"_id": item["_id"]},
-                            {"$set": {"image_url": secure_url}}
-                        )
-                        print(f"   ✅ Updated DB: {secure_url}")
-                        updated += 1
-                        
-                        # Optional: Rename local file to indicate it's migrated
-                        # os.rename(file_path, file_path + ".migrated")
-                    else:
-                        print("   ❌ Upload failed: No URL returned")
-                        errors += 1
-                        
-                except Exception as e:
-                    print(f"   ❌ Error uploading: {e}")
-                    errors += 1
-            else:
-                print(f"   ⚠️  File not found locally: {file_path}")
-                # Maybe update DB to mark as missing? Or leave as broken link?
-                # Leaving as is for safety.
-                errors += 1
-        else:
-            # Already migrated or external URL
-            # print(f"   ⏭️  Skipping (already remote): {item.get('title')}")
-            pass
-            
-        count += 1
+    checkpoint = Checkpoint(checkpoint_path)
+    if checkpoint.done:
+        print(f"↩️  Resuming: {len(checkpoint.done)} files already uploaded per {checkpoint_path}")
 
+    migration = Migration(dry_run, concurrency, checkpoint)
+    started = time.monotonic()
+    await migration.run(collections)
+    elapsed = max(time.monotonic() - started, 1e-6)
+
+    stats = migration.stats
+    uploaded = len([u for u in migration.in_flight.values() if u.result()])
     print("-" * 30)
-    print(f"Migration Complete!")
-    print(f"Total Items Scanned: {count}")
-    print(f"Actually Migrated: {updated}")
-    print(f"Errors/Missing Files: {errors}")
+    print(f"Migration Complete!" if not dry_run else "Dry run complete, nothing was changed.")
+    print(f"Documents Scanned: {stats['scanned']}")
+    print(f"Local Media References: {stats['files']}")
+    print(f"Uploaded This Run: {uploaded} ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"Reused From Checkpoint: {stats['resumed']}")
+    print(f"Fields Rewritten: {stats['migrated']}")
+    print(f"Errors/Missing Files: {stats['errors'] + stats['missing']}")
+    print(f"Elapsed: {elapsed:.1f}s, {uploaded / elapsed:.2f} files/s, {stats['bytes'] / 1024 / 1024 / elapsed:.2f} MB/s")
+
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(migrate_images())
+    parser = argparse.ArgumentParser(description="Migrate /uploads/ media to Cloudinary")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be migrated, change nothing")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel uploads (default 4)")
+    parser.add_argument("--collections", default=",".join(FOLDERS),
+                        help="comma separated subset of: " + ", ".join(FOLDERS))
+    parser.add_argument("--checkpoint", default=".migration_checkpoint.ndjson",
+                        help="file recording finished uploads, for resuming")
+    parser.add_argument("--backfill-variants", action="store_true",
+                        help="only add responsive image URLs to documents already on Cloudinary")
+    args = parser.parse_args()
+
+    selected = [c.strip() for c in args.collections.split(",") if c.strip()]
+    unknown = set(selected) - set(FOLDERS)
+    if unknown:
+        parser.error(f"unknown collections: {', '.join(sorted(unknown))}")
+
+    if args.backfill_variants:
+        asyncio.run(backfill_variants(selected, args.dry_run))
+    else:
+        asyncio.run(migrate_images(args.dry_run, max(args.concurrency, 1), selected, args.checkpoint))
@@ -82,3 +82,17 @@ class ProjectUpdateCreate(ProjectUpdateBase):
 class ProjectUpdate(ProjectUpdateBase):
     id: str
 
+
+# Per-stage edits. `version` is the project update's version as last read by
+# the client; when sent, the edit is rejected with 409 if someone else saved first.
+class StageCreate(BaseModel):
+    name: str = Field(..., min_length=1)
+    version: Optional[int] = None
+
+class StageRename(BaseModel):
+    name: str = Field(..., min_length=1)
+    version: Optional[int] = None
+
+class StageOrder(BaseModel):
+    order: List[str]
+    version: Optional[int] = None
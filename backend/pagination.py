@@ -0,0 +1,109 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+from serialization import find_documents
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(document: dict, sort_field: str) -> str:
+    """
+    Opaque cursor pointing just after `document` in a (sort_field, _id) ordering.
+    """
+    value = document.get(sort_field)
+    if sort_field == "_id":
+        payload = {}
+    elif isinstance(value, datetime):
+        payload = {"v": value.isoformat(), "t": "dt"}
+    else:
+        payload = {"v": value}
+    # API-shaped documents carry `id`, raw ones `_id`
+    payload["id"] = str(document["id"] if "id" in document else document["_id"])
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        value = payload.get("v")
+        if payload.get("t") == "dt":
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(sort_field: str, cursor: Optional[str], direction: int = -1) -> dict:
+    """
+    Query clause selecting the documents after `cursor` for a sort on
+    (sort_field, _id) in `direction`. The sort field alone is not unique,
+    so `_id` breaks ties.
+    """
+    if not cursor:
+        return {}
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    if sort_field == "_id":
+        return {"_id": {op: last_id}}
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}},
+    ]}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+    direction: int = -1,
+):
+    """
+    Returns (documents, next_cursor) for one keyset page of `collection`.
+    One extra document is fetched to know whether another page exists.
+    Documents are API-shaped (string `id`, no `_id`), see serialization.
+    """
+    page_size = clamp_page_size(limit)
+    after = keyset_filter(sort_field, cursor, direction)
+    if after:
+        query = {"$and": [query, after]} if query else after
+
+    sort = [(sort_field, direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    documents = await find_documents(collection, query, sort, page_size + 1, projection)
+
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+    return documents, next_cursor
+
+
+def parse_projection(fields: Optional[str], allowed: set, required: tuple = ()) -> Optional[dict]:
+    """
+    Turns a comma separated `fields` query parameter into a Mongo projection.
+    Unknown field names are rejected so the projection can't leak internals.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {name: 1 for name in requested | set(required)}
@@ -0,0 +1,173 @@
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from cache import catalog_cache
+from cloudinary_service import media_variant_list
+from database import DB
+
+
+def project_object_id(update_id: str) -> ObjectId:
+    try:
+        return ObjectId(update_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail="Update not found")
+
+
+def version_filter(version: Optional[int]) -> dict:
+    # Documents written before versioning have no field; they count as version 0
+    if version is None:
+        return {}
+    if version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": version}
+
+
+def check_version(document: dict, version: Optional[int]):
+    current = document.get("version", 0)
+    if version is not None and current != version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Project update was changed by someone else (now version {current}), reload and retry",
+        )
+
+
+async def apply_project_change(update_id: str, version: Optional[int], update: dict,
+                               match: Optional[dict] = None, missing_detail: str = "Stage not found",
+                               missing_status: int = 404) -> int:
+    """
+    Applies `update` to one project update in a single conditional write and
+    bumps its version. `match` narrows the filter (e.g. the stage must exist).
+    Returns the new version; raises 404 for a missing document, 409 when
+    `version` is stale and `missing_status`/`missing_detail` when `match` fails.
+    """
+    object_id = project_object_id(update_id)
+    update = dict(update)
+    update["$inc"] = {"version": 1}
+    update["$set"] = {**update.get("$set", {}), "updated_at": datetime.now()}
+
+    query = {"_id": object_id, **version_filter(version), **(match or {})}
+    try:
+        document = await DB.project_updates.find_one_and_update(
+            query, update, projection={"version": 1}, return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        print(f"Error updating project update {update_id}: {e}")
+        raise HTTPException(status_code=500, detail="Database Error")
+
+    if document:
+        catalog_cache.invalidate("project_updates")
+        return document["version"]
+
+    current = await DB.project_updates.find_one({"_id": object_id}, {"version": 1})
+    if not current:
+        raise HTTPException(status_code=404, detail="Update not found")
+    check_version(current, version)
+    raise HTTPException(status_code=missing_status, detail=missing_detail)
+
+
+async def load_project(update_id: str, version: Optional[int], stage_name: Optional[str] = None) -> dict:
+    """
+    Reads a project update's version and stage list, raising 404 if it (or
+    `stage_name`) doesn't exist and 409 if `version` is stale.
+    """
+    document = await DB.project_updates.find_one({"_id": project_object_id(update_id)}, {"work_stages": 1, "version": 1})
+    if not document:
+        raise HTTPException(status_code=404, detail="Update not found")
+    check_version(document, version)
+    if stage_name is not None and stage_name not in stage_names(document):
+        raise HTTPException(status_code=404, detail="Stage not found")
+    return document
+
+
+def stage_names(document: dict) -> List[str]:
+    # Legacy string stages stay in the list so positions line up with the array
+    return [stage.get("name") if isinstance(stage, dict) else stage for stage in document.get("work_stages", [])]
+
+
+async def add_stage(update_id: str, name: str, version: Optional[int]) -> int:
+    return await apply_project_change(
+        update_id, version,
+        {"$push": {"work_stages": {"name": name, "images": []}}},
+        match={"work_stages.name": {"$ne": name}},
+        missing_detail=f"Stage '{name}' already exists",
+        missing_status=409,
+    )
+
+
+async def remove_stage(update_id: str, name: str, version: Optional[int]) -> int:
+    return await apply_project_change(
+        update_id, version,
+        {"$pull": {"work_stages": {"name": name}}},
+        match={"work_stages.name": name},
+    )
+
+
+async def rename_stage(update_id: str, name: str, new_name: str, version: Optional[int]) -> int:
+    if new_name == name:
+        return await apply_project_change(update_id, version, {}, match={"work_stages.name": name})
+    # Look the stage position up first: the positional `$` operator can't be
+    # combined with a "new name is free" condition on the same array
+    document = await load_project(update_id, version, name)
+    names = stage_names(document)
+    if new_name in names:
+        raise HTTPException(status_code=409, detail=f"Stage '{new_name}' already exists")
+    index = names.index(name)
+    # The version the stage list was read at guards the index, even if the client sent none
+    return await apply_project_change(
+        update_id, document.get("version", 0),
+        {"$set": {f"work_stages.{index}.name": new_name}},
+        match={f"work_stages.{index}.name": name},
+    )
+
+
+async def reorder_stages(update_id: str, order: List[str], version: Optional[int]) -> int:
+    document = await load_project(update_id, version)
+    stages = {stage["name"]: stage for stage in document.get("work_stages", []) if isinstance(stage, dict)}
+    if len(order) != len(set(order)) or set(order) != set(stages):
+        raise HTTPException(status_code=400, detail="order must list every stage name exactly once")
+    # Rewrites the stage array, but only if nothing changed since it was read
+    return await apply_project_change(
+        update_id, document.get("version", 0),
+        {"$set": {"work_stages": [stages[name] for name in order]}},
+    )
+
+
+async def add_stage_images(update_id: str, name: str, urls: List[str], version: Optional[int]) -> int:
+    return await apply_project_change(
+        update_id, version,
+        {
+            "$push": {"work_stages.$.images": {"$each": urls}},
+            # Deduplicated uploads can hand back a URL the project already has
+            "$addToSet": {"media_variants": {"$each": media_variant_list(urls)}},
+        },
+        match={"work_stages.name": name},
+    )
+
+
+async def remove_stage_image(update_id: str, name: str, url: str, version: Optional[int]) -> int:
+    version = await apply_project_change(
+        update_id, version,
+        {"$pull": {"work_stages.$.images": url}},
+        match={"work_stages": {"$elemMatch": {"name": name, "images": url}}},
+        missing_detail="Image not found in stage",
+    )
+    # The same URL can also be the main image or sit in another stage (deduplicated
+    # uploads); its variants go only once nothing references it. The condition is
+    # checked in the write itself, so a concurrent add of the URL keeps them.
+    try:
+        result = await DB.project_updates.update_one(
+            {"_id": project_object_id(update_id), "main_image": {"$ne": url}, "work_stages.images": {"$ne": url}},
+            {"$pull": {"media_variants": {"url": url}}},
+        )
+        if result.modified_count:
+            # A catalog read since the first write may have cached the old variants
+            catalog_cache.invalidate("project_updates")
+    except Exception as e:
+        # A leftover variant entry is harmless, the image itself is already gone
+        print(f"Error pruning media variants of project update {update_id}: {e}")
+    return version
@@ -0,0 +1,338 @@
+import asyncio
+import bisect
+import heapq
+import math
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+
+from cache import LRUCache
+from database import DB
+from settings import settings
+
+# Query terms shorter than this only match whole words ("a" would expand to everything)
+SEARCH_MIN_PREFIX = settings.search_min_prefix
+# Cap on the words one prefix expands to, keeps short prefixes fast on a large catalog
+SEARCH_MAX_EXPANSIONS = settings.search_max_expansions
+SEARCH_REBUILD_INTERVAL = settings.search_rebuild_interval
+# Backoff between failed builds: doubles from the first value up to the second
+SEARCH_REBUILD_RETRY = (1, 60)
+# A word that only starts with the query term counts this much of an exact match
+PREFIX_MATCH_WEIGHT = 0.6
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 300
+MAX_QUERY_TERMS = 8
+
+# Per collection: searchable fields and their weights, and how a hit is shown
+SOURCES = {
+    "portfolio": {
+        "fields": {"title": 3.0, "scope": 2.0, "category": 1.5, "description": 1.0},
+        "title": "title", "subtitle": "category", "image": "image_url",
+    },
+    "hardware": {
+        "fields": {"name": 3.0, "tag": 1.5, "description": 1.0},
+        "title": "name", "subtitle": "tag", "image": "image_url",
+    },
+    "project_updates": {
+        "fields": {"site_name": 3.0, "location": 2.0},
+        "title": "site_name", "subtitle": "location", "image": "main_image",
+    },
+}
+
+_WORD = re.compile(r"\w+")
+# Not indexed: they are in nearly every description and would make the
+# postings scanned for a query like "tiles for the kitchen" huge
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "its",
+    "of", "on", "or", "the", "this", "that", "to", "with",
+}
+
+Key = Tuple[str, str]
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words with accents folded, so "Café" matches "cafe"; no stop words."""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", str(text).casefold())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return [word for word in _WORD.findall(folded) if word not in STOP_WORDS]
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the portfolio, hardware and project update
+    catalog. Each word maps to the documents containing it with a field
+    weight; a sorted vocabulary turns prefix matching into a bisect. Kept
+    current by the write endpoints (`add`/`remove`), rebuilt from Mongo on
+    startup and every SEARCH_REBUILD_INTERVAL seconds.
+
+    Postings are keyed by a small int per document rather than (type, id):
+    int keys hash for free, which matters when a common word matches most of
+    the catalog.
+    """
+
+    def __init__(self):
+        self._numbers: Dict[Key, int] = {}
+        self._next_number = 0
+        # number -> result entry ({"type", "id", "title", ...})
+        self.documents: Dict[int, dict] = {}
+        self._types: Dict[int, str] = {}
+        self._terms: Dict[int, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # None while `build` fills the index
+        self._vocabulary: Optional[List[str]] = []
+        # Type-ahead repeats the same queries; any change to the index clears it
+        self._results = LRUCache(max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def replace_with(self, other: "SearchIndex"):
+        # Swapped in one step, so a search never sees a half-built index
+        self.__dict__.update(other.__dict__)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, dict]]) -> "SearchIndex":
+        """A new index over (kind, document) pairs, sorting the vocabulary once."""
+        index = cls()
+        index._vocabulary = None
+        for kind, document in documents:
+            index.add(kind, document)
+        index._vocabulary = sorted(index._postings)
+        return index
+
+    def add(self, kind: str, document: dict):
+        """Indexes (or re-indexes) a Mongo document of collection `kind`."""
+        source = SOURCES[kind]
+        document_id = str(document["_id"])
+        self.remove(kind, document_id)
+        number = self._next_number
+        self._next_number += 1
+        self._numbers[(kind, document_id)] = number
+
+        terms: Dict[str, float] = {}
+        for field, weight in source["fields"].items():
+            for token in tokenize(document.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+        for token, weight in terms.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                if self._vocabulary is not None:
+                    bisect.insort(self._vocabulary, token)
+            postings[number] = weight
+        self._terms[number] = terms
+        self._types[number] = kind
+        self.documents[number] = {
+            "type": kind,
+            "id": document_id,
+            "title": document.get(source["title"]) or "",
+            "subtitle": document.get(source["subtitle"]) or "",
+            "image_url": document.get(source["image"]) or "",
+        }
+        self._results.clear()
+
+    def remove(self, kind: str, document_id: str):
+        number = self._numbers.pop((kind, document_id), None)
+        if number is None:
+            return
+        for token in self._terms.pop(number):
+            postings = self._postings[token]
+            del postings[number]
+            if not postings:
+                del self._postings[token]
+                if self._vocabulary is not None:
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        del self.documents[number]
+        del self._types[number]
+        self._results.clear()
+
+    def _expand(self, term: str) -> Iterable[str]:
+        if len(term) < SEARCH_MIN_PREFIX:
+            return [term] if term in self._postings else []
+        start = bisect.bisect_left(self._vocabulary, term)
+        end = min(start + SEARCH_MAX_EXPANSIONS, len(self._vocabulary))
+        end = bisect.bisect_left(self._vocabulary, term + "\uffff", start, end)
+        return self._vocabulary[start:end]
+
+    def _weighted_tokens(self, term: str) -> List[Tuple[Dict[int, float], float]]:
+        # (postings, factor) per word the term expands to. Rarer words weigh
+        # more (idf); words that only start with the term weigh less.
+        total = len(self.documents)
+        weighted = []
+        for token in self._expand(term):
+            postings = self._postings[token]
+            factor = math.log(1 + total / len(postings))
+            weighted.append((postings, factor if token == term else factor * PREFIX_MATCH_WEIGHT))
+        return weighted
+
+    @staticmethod
+    def _term_scores(weighted, candidates=None) -> Dict[int, float]:
+        """
+        Each matching document's score for one term: its best expansion's
+        weight times that expansion's factor. With `candidates`, only those
+        documents are scored.
+        """
+        if len(weighted) == 1:
+            postings, factor = weighted[0]
+            if candidates is None:
+                return {number: weight * factor for number, weight in postings.items()}
+            return {number: postings[number] * factor for number in candidates & postings.keys()}
+        scores: Dict[int, float] = {}
+        for postings, factor in weighted:
+            numbers = postings.keys() if candidates is None else candidates & postings.keys()
+            for number in numbers:
+                score = postings[number] * factor
+                if score > scores.get(number, 0.0):
+                    scores[number] = score
+        return scores
+
+    def search(self, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 20) -> dict:
+        """
+        Documents containing every query term (each as a word or a word
+        prefix), best first. `facets` counts the matches per type before the
+        `kinds` filter, so a UI can show "Hardware (12)" next to each tab.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        kinds = None if kinds is None else tuple(sorted(set(kinds)))
+        cache_key = (" ".join(terms), kinds, limit)
+        result = self._results.get(cache_key)
+        if result is not None:
+            return result
+
+        matches: Dict[int, float] = {}
+        if terms:
+            # Start from the rarest term; later terms only score the remaining candidates
+            per_term = sorted((self._weighted_tokens(term) for term in terms),
+                              key=lambda weighted: sum(len(postings) for postings, _ in weighted))
+            matches = self._term_scores(per_term[0])
+            for weighted in per_term[1:]:
+                scores = self._term_scores(weighted, matches.keys())
+                matches = {number: matches[number] + score for number, score in scores.items()}
+
+        facets = Counter(map(self._types.__getitem__, matches))
+        if kinds is not None:
+            matches = {number: score for number, score in matches.items() if self._types[number] in kinds}
+        best = heapq.nlargest(limit, matches, key=matches.__getitem__)
+        result = {
+            "items": [{**self.documents[number], "score": round(matches[number], 3)} for number in best],
+            "total": len(matches),
+            "facets": {"type": {kind: facets.get(kind, 0) for kind in SOURCES}},
+        }
+        self._results.set(cache_key, result)
+        return result
+
+
+def _projection(kind: str) -> dict:
+    source = SOURCES[kind]
+    return {field: 1 for field in [*source["fields"], source["title"], source["subtitle"], source["image"]]}
+
+
+search_index = SearchIndex()
+# Set by the first successful build; a failed periodic rebuild keeps serving the last index
+_ready = asyncio.Event()
+_build_failed = False
+# Ids written while a rebuild is reading Mongo, re-read once it is swapped in
+_changed_during_rebuild: Optional[set] = None
+
+
+async def rebuild_search_index():
+    """
+    Builds a fresh index from all three collections and swaps it in.
+    Raises if Mongo can't be read, leaving the current index in place.
+    """
+    global _changed_during_rebuild
+    started = time.perf_counter()
+    _changed_during_rebuild = set()
+    try:
+        documents = []
+        for kind in SOURCES:
+            async for document in DB[kind].find({}, _projection(kind)):
+                documents.append((kind, document))
+        index = SearchIndex.build(documents)
+        search_index.replace_with(index)
+        changed, _changed_during_rebuild = _changed_during_rebuild, None
+        for kind, document_id in changed:
+            await refresh_search_document(kind, document_id)
+        print(f"Search index built: {len(index)} documents in {time.perf_counter() - started:.2f}s")
+    finally:
+        _changed_during_rebuild = None
+
+
+async def run_search_index(interval: float = SEARCH_REBUILD_INTERVAL):
+    """
+    Long-running task started with the app: builds the index, retrying with
+    backoff until it succeeds, then rebuilds it every `interval` seconds
+    (never if 0) so writes made by other workers show up.
+    """
+    global _build_failed
+    delay, max_delay = SEARCH_REBUILD_RETRY
+    while True:
+        try:
+            await rebuild_search_index()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _build_failed = True
+            print(f"Search index build failed, retrying in {delay}s: {e!r}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+            continue
+        _build_failed = False
+        _ready.set()
+        delay = SEARCH_REBUILD_RETRY[0]
+        if not interval:
+            return
+        await asyncio.sleep(interval)
+
+
+async def wait_for_search_index(timeout: float):
+    """
+    Waits for the first build. Raises asyncio.TimeoutError after `timeout`,
+    or straight away while builds are failing.
+    """
+    if _ready.is_set():
+        return
+    if _build_failed:
+        raise asyncio.TimeoutError()
+    await asyncio.wait_for(_ready.wait(), timeout)
+
+
+async def refresh_search_document(kind: str, document_id: str):
+    """Re-reads one document after a write; removes it if it's gone."""
+    await refresh_search_documents(kind, [document_id])
+
+
+async def refresh_search_documents(kind: str, document_ids: List[str]):
+    if _changed_during_rebuild is not None:
+        _changed_during_rebuild.update((kind, document_id) for document_id in document_ids)
+    try:
+        object_ids = [ObjectId(document_id) for document_id in document_ids]
+        found = set()
+        async for document in DB[kind].find({"_id": {"$in": object_ids}}, _projection(kind)):
+            search_index.add(kind, document)
+            found.add(str(document["_id"]))
+        for document_id in document_ids:
+            if document_id not in found:
+                search_index.remove(kind, document_id)
+    except Exception as e:
+        # The next periodic rebuild picks the change up
+        print(f"Search index refresh failed for {kind}: {e}")
+
+
+def index_search_document(kind: str, document: dict):
+    """Indexes a document the caller just inserted (it carries its `_id`)."""
+    if _changed_during_rebuild is not None:
+        _changed_during_rebuild.add((kind, str(document["_id"])))
+    search_index.add(kind, document)
+
+
+def remove_search_document(kind: str, document_id: str):
+    if _changed_during_rebuild is not None:
+        _changed_during_rebuild.add((kind, document_id))
+    search_index.remove(kind, document_id)
@@ -0,0 +1,49 @@
+from typing import List, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+
+
+def _default(value):
+    # orjson handles datetime natively; ObjectId is the only Mongo type left
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=_default)
+
+
+def json_response(data, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    Pre-encoded JSON response. Skips FastAPI's response_model validation and
+    jsonable_encoder pass, which list endpoints don't need.
+    """
+    return Response(content=dumps(data), status_code=status_code, media_type="application/json", headers=headers)
+
+
+def with_id_stages(projection: Optional[dict] = None) -> List[dict]:
+    """
+    Aggregation stages that apply `projection` and replace `_id` with a string
+    `id`, so documents come back from Mongo ready to serialize.
+    """
+    stages = [{"$project": projection}] if projection else []
+    stages.append({"$addFields": {"id": {"$toString": "$_id"}}})
+    stages.append({"$project": {"_id": 0}})
+    return stages
+
+
+async def find_documents(collection, query: Optional[dict] = None, sort: Optional[list] = None,
+                         limit: Optional[int] = None, projection: Optional[dict] = None) -> List[dict]:
+    """
+    `find()` equivalent returning API-shaped documents (`id` instead of `_id`).
+    """
+    pipeline = [{"$match": query or {}}]
+    if sort:
+        pipeline.append({"$sort": dict(sort)})
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.extend(with_id_stages(projection))
+    return await collection.aggregate(pipeline).to_list(length=None)
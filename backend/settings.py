@@ -0,0 +1,194 @@
+"""
+Configuration for the whole backend, read from the environment (and .env)
+once, on first import. Modules take their values from `settings` instead of
+calling os.getenv themselves.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Reference point for the startup report (see metrics.record_startup); main.py
+# imports this module before anything heavy.
+PROCESS_STARTED = time.perf_counter()
+
+load_dotenv()
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() not in ("false", "0", "no", "off")
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Database
+    mongodb_url: Optional[str]
+    mongo_breaker_failures: int
+    mongo_breaker_reset: float
+
+    # Lead spool
+    lead_write_timeout: float
+    lead_spool_path: str
+    lead_spool_replay_batch: int
+    lead_spool_replay_interval: float
+
+    # Auth
+    secret_key: str
+    auth_user_cache_ttl: int
+    bcrypt_rounds: int
+    bcrypt_workers: int
+
+    # Caches
+    catalog_cache_ttl: int
+    catalog_cache_max_entries: int
+    chat_cache_size: int
+    chat_cache_ttl: int
+    chat_cache_stop_words: bool
+    chat_session_cache_size: int
+    chat_session_ttl: int
+    chat_history_token_budget: int
+
+    # Gemini
+    gemini_api_key: Optional[str]
+
+    # Cloudinary
+    cloudinary_cloud_name: Optional[str]
+    cloudinary_api_key: Optional[str]
+    cloudinary_api_secret: Optional[str]
+    cloudinary_large_upload_threshold: int
+    cloudinary_upload_chunk_size: int
+    cloudinary_upload_concurrency: int
+    cloudinary_upload_workers: int
+    cloudinary_upload_queue_size: int
+    cloudinary_upload_retries: int
+    cloudinary_upload_backoff_base: float
+    cloudinary_upload_backoff_max: float
+    cloudinary_eager: bool
+    media_dedup: bool
+    responsive_widths: Tuple[int, ...]
+    video_poster_width: int
+
+    # Email
+    mail_username: Optional[str]
+    mail_password: Optional[str]
+    mail_from: Optional[str]
+    mail_port: int
+    mail_server: str
+    mail_from_name: str
+    outbox_batch_size: int
+    outbox_poll_interval: float
+    outbox_max_attempts: int
+    outbox_digest: bool
+    smtp_idle_timeout: float
+
+    # Bulk import
+    bulk_write_batch_size: int
+    max_import_rows: int
+
+    # Legacy /uploads
+    uploads_max_age: int
+    uploads_memory_file_limit: int
+    uploads_memory_cache_entries: int
+
+    # Search
+    search_min_prefix: int
+    search_max_expansions: int
+    search_rebuild_interval: float
+
+    # Metrics / startup
+    metrics_token: Optional[str]
+    metrics_loop_lag_interval: float
+    warm_sdks: bool
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            mongodb_url=os.getenv("MONGODB_URL"),
+            mongo_breaker_failures=_int("MONGO_BREAKER_FAILURES", 3),
+            mongo_breaker_reset=_float("MONGO_BREAKER_RESET", 15),
+
+            lead_write_timeout=_float("LEAD_WRITE_TIMEOUT", 2.0),
+            lead_spool_path=os.getenv("LEAD_SPOOL_PATH", "lead_spool.ndjson"),
+            lead_spool_replay_batch=_int("LEAD_SPOOL_REPLAY_BATCH", 100),
+            lead_spool_replay_interval=_float("LEAD_SPOOL_REPLAY_INTERVAL", 5),
+
+            secret_key=os.getenv("SECRET_KEY", "supersecretkey"),
+            auth_user_cache_ttl=_int("AUTH_USER_CACHE_TTL", 60),
+            bcrypt_rounds=_int("BCRYPT_ROUNDS", 12),
+            bcrypt_workers=_int("BCRYPT_WORKERS", 2),
+
+            catalog_cache_ttl=_int("CATALOG_CACHE_TTL", 300),
+            catalog_cache_max_entries=_int("CATALOG_CACHE_MAX_ENTRIES", 1024),
+            chat_cache_size=_int("CHAT_CACHE_SIZE", 500),
+            chat_cache_ttl=_int("CHAT_CACHE_TTL", 6 * 60 * 60),
+            chat_cache_stop_words=_bool("CHAT_CACHE_STOP_WORDS", False),
+            chat_session_cache_size=_int("CHAT_SESSION_CACHE_SIZE", 1000),
+            chat_session_ttl=_int("CHAT_SESSION_TTL", 24 * 60 * 60),
+            chat_history_token_budget=_int("CHAT_HISTORY_TOKEN_BUDGET", 2000),
+
+            gemini_api_key=os.getenv("GEMINI_API_KEY"),
+
+            cloudinary_cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            cloudinary_api_key=os.getenv("CLOUDINARY_API_KEY"),
+            cloudinary_api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+            cloudinary_large_upload_threshold=_int("CLOUDINARY_LARGE_UPLOAD_THRESHOLD", 20 * 1024 * 1024),
+            cloudinary_upload_chunk_size=_int("CLOUDINARY_UPLOAD_CHUNK_SIZE", 6 * 1024 * 1024),
+            cloudinary_upload_concurrency=_int("CLOUDINARY_UPLOAD_CONCURRENCY", 4),
+            cloudinary_upload_workers=_int("CLOUDINARY_UPLOAD_WORKERS", 4),
+            cloudinary_upload_queue_size=_int("CLOUDINARY_UPLOAD_QUEUE_SIZE", 32),
+            cloudinary_upload_retries=_int("CLOUDINARY_UPLOAD_RETRIES", 3),
+            cloudinary_upload_backoff_base=_float("CLOUDINARY_UPLOAD_BACKOFF_BASE", 0.5),
+            cloudinary_upload_backoff_max=_float("CLOUDINARY_UPLOAD_BACKOFF_MAX", 8.0),
+            cloudinary_eager=_bool("CLOUDINARY_EAGER", False),
+            media_dedup=_bool("MEDIA_DEDUP", True),
+            responsive_widths=tuple(sorted(
+                int(w) for w in os.getenv("RESPONSIVE_WIDTHS", "320,640,960,1280,1920").split(",") if w.strip()
+            )),
+            video_poster_width=_int("VIDEO_POSTER_WIDTH", 1280),
+
+            mail_username=os.getenv("MAIL_USERNAME"),
+            mail_password=os.getenv("MAIL_PASSWORD"),
+            mail_from=os.getenv("MAIL_FROM"),
+            mail_port=_int("MAIL_PORT", 587),
+            mail_server=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
+            mail_from_name=os.getenv("MAIL_FROM_NAME", "Ramdev Builders Website"),
+            outbox_batch_size=_int("OUTBOX_BATCH_SIZE", 20),
+            outbox_poll_interval=_float("OUTBOX_POLL_INTERVAL", 30),
+            outbox_max_attempts=_int("OUTBOX_MAX_ATTEMPTS", 8),
+            outbox_digest=_bool("OUTBOX_DIGEST", False),
+            smtp_idle_timeout=_float("SMTP_IDLE_TIMEOUT", 120),
+
+            bulk_write_batch_size=_int("BULK_WRITE_BATCH_SIZE", 100),
+            max_import_rows=_int("MAX_IMPORT_ROWS", 5000),
+
+            uploads_max_age=_int("UPLOADS_MAX_AGE", 24 * 60 * 60),
+            uploads_memory_file_limit=_int("UPLOADS_MEMORY_FILE_LIMIT", 256 * 1024),
+            uploads_memory_cache_entries=_int("UPLOADS_MEMORY_CACHE_ENTRIES", 256),
+
+            search_min_prefix=_int("SEARCH_MIN_PREFIX", 2),
+            search_max_expansions=_int("SEARCH_MAX_EXPANSIONS", 200),
+            # Full rebuild from Mongo, picks up writes made by other workers; 0 = startup only
+            search_rebuild_interval=_float("SEARCH_REBUILD_INTERVAL", 300),
+
+            metrics_token=os.getenv("METRICS_TOKEN") or None,
+            metrics_loop_lag_interval=_float("METRICS_LOOP_LAG_INTERVAL", 0.5),
+            # Import the Gemini/Cloudinary/mail SDKs in the background right
+            # after startup, so the first chat or upload doesn't pay for them
+            warm_sdks=_bool("WARM_SDKS", True),
+        )
+
+
+settings = Settings.from_env()
@@ -0,0 +1,137 @@
+import os
+import re
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from cache import LRUCache
+from settings import settings
+
+# Browser/CDN lifetime for names that may be overwritten in place
+UPLOADS_MAX_AGE = settings.uploads_max_age
+# Files up to this size are kept in memory; larger ones (videos) are streamed
+UPLOADS_MEMORY_FILE_LIMIT = settings.uploads_memory_file_limit
+UPLOADS_MEMORY_CACHE_ENTRIES = settings.uploads_memory_cache_entries
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# A uuid or a long hex digest in the file name means new content gets a new name
+_HASHED_NAME = re.compile(r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}|[0-9a-f]{16,}", re.I)
+# Checked in this order; only used when the sibling file exists
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows `encoding`: listed (or covered
+    by `*`) with a q-value above 0. "br;q=0" refuses br; "x-gzip" isn't gzip.
+    """
+    wildcard = None
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == encoding:
+            return q > 0
+        if name == "*":
+            wildcard = q > 0
+    return bool(wildcard)
+
+
+def cache_control_for(path: str) -> str:
+    if _HASHED_NAME.search(os.path.basename(path)):
+        return IMMUTABLE_CACHE_CONTROL
+    return f"public, max-age={UPLOADS_MAX_AGE}"
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles for the legacy /uploads mount, with:
+    - long-lived Cache-Control (immutable for content-hashed names) on every
+      response, including 304s;
+    - precompressed `.br`/`.gz` siblings when the client accepts them;
+    - small files served from an in-memory LRU, revalidated by mtime/size;
+    - everything else (large files, Range requests) left to FileResponse,
+      which answers byte ranges and uses the server's zero-copy `pathsend`
+      extension when available.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (path, mtime_ns, size) -> body; a changed file simply misses
+        self.memory_cache = LRUCache(max_entries=UPLOADS_MEMORY_CACHE_ENTRIES, ttl=UPLOADS_MAX_AGE)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["cache-control"] = cache_control_for(str(full_path))
+        if self.is_not_modified(response.headers, request_headers):
+            # NotModifiedResponse keeps cache-control, so the lifetime is renewed too
+            return NotModifiedResponse(response.headers)
+        return response
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+
+        request_headers = Headers(scope=scope)
+        # FileResponse already answers HEAD and byte ranges without reading the body
+        if scope["method"] == "HEAD" or "range" in request_headers:
+            return response
+
+        compressed = await self._precompressed(response, request_headers)
+        if compressed is not None:
+            return compressed
+
+        stat_result = response.stat_result
+        if stat_result is None or stat_result.st_size > UPLOADS_MEMORY_FILE_LIMIT:
+            return response
+
+        key = (str(response.path), stat_result.st_mtime_ns, stat_result.st_size)
+        body = self.memory_cache.get(key)
+        if body is None:
+            body = await anyio.to_thread.run_sync(_read_file, str(response.path))
+            self.memory_cache.set(key, body)
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+        return Response(body, headers=headers, media_type=response.media_type)
+
+    async def _precompressed(self, response: FileResponse, request_headers: Headers) -> Optional[FileResponse]:
+        media_type = response.media_type or ""
+        # Photos and videos are already compressed; don't stat for siblings that can't help
+        if media_type.startswith(("image/", "video/", "audio/")) and media_type != "image/svg+xml":
+            return None
+        accepted = request_headers.get("accept-encoding", "")
+        for encoding, suffix in PRECOMPRESSED:
+            if not accepts_encoding(accepted, encoding):
+                continue
+            candidate = str(response.path) + suffix
+            try:
+                stat_result = await anyio.to_thread.run_sync(os.stat, candidate)
+            except OSError:
+                continue
+            headers = {
+                "cache-control": response.headers["cache-control"],
+                "content-encoding": encoding,
+                # Weak: same content as the plain file, different bytes on the wire
+                "etag": "W/" + response.headers["etag"],
+                "last-modified": response.headers["last-modified"],
+                "vary": "Accept-Encoding",
+            }
+            return FileResponse(candidate, stat_result=stat_result, headers=headers, media_type=response.media_type)
+        return None
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
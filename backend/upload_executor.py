@@ -0,0 +1,141 @@
+import asyncio
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from settings import settings
+
+UPLOAD_WORKERS = settings.cloudinary_upload_workers
+# Uploads waiting for or holding a worker; beyond this callers get a 503
+UPLOAD_QUEUE_SIZE = settings.cloudinary_upload_queue_size
+UPLOAD_RETRIES = settings.cloudinary_upload_retries
+UPLOAD_BACKOFF_BASE = settings.cloudinary_upload_backoff_base
+UPLOAD_BACKOFF_MAX = settings.cloudinary_upload_backoff_max
+
+
+class UploadQueueFull(Exception):
+    """Raised when the upload queue is at capacity; mapped to 503 in main.py."""
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Errors worth retrying: rate limits, Cloudinary 5xx and network failures.
+    Bad requests, auth errors and the like fail straight away.
+    """
+    # Imported here so loading this module doesn't pull in the Cloudinary SDK
+    import cloudinary.exceptions
+
+    if isinstance(error, (cloudinary.exceptions.RateLimited, cloudinary.exceptions.GeneralError)):
+        return True
+    # Not OSError as a whole: a missing or unreadable local file won't fix itself
+    if isinstance(error, (ConnectionError, TimeoutError, socket.timeout, socket.gaierror)):
+        return True
+    if type(error) is cloudinary.exceptions.Error:
+        # The SDK wraps urllib3/socket failures and non-JSON (e.g. 502) replies in the base class
+        message = str(error)
+        return message.startswith(("Socket error", "Unexpected error", "Error parsing server response"))
+    return False
+
+
+class UploadExecutor:
+    """
+    Runs blocking Cloudinary SDK calls on a thread pool of their own, so a
+    burst of uploads can't starve the default executor that Motor, DNS and
+    Starlette's threadpool share. At most `max_pending` calls are admitted.
+    """
+
+    def __init__(self, workers: int = UPLOAD_WORKERS, max_pending: int = UPLOAD_QUEUE_SIZE,
+                 retries: int = UPLOAD_RETRIES):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retries = retries
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cloudinary-upload")
+        self.pending = 0
+        self.running = 0
+        self._running_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+        self.run_seconds_max = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs `fn(*args, **kwargs)` on the upload pool, retrying transient
+        errors with full-jitter exponential backoff. `fn` must be safe to call
+        again after a failure (the upload helpers rewind their file first).
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise UploadQueueFull("Upload queue is full, try again shortly")
+
+        self.pending += 1
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._run_once(partial(fn, *args, **kwargs))
+                except Exception as e:
+                    if attempt == self.retries or not is_transient(e):
+                        self.failed += 1
+                        raise
+                    self.retried += 1
+                    delay = random.uniform(0, min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * 2 ** attempt))
+                    print(f"Cloudinary transient error ({e}), retry {attempt + 1}/{self.retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            self.pending -= 1
+
+    async def _run_once(self, call):
+        submitted_at = time.monotonic()
+        started_at = []
+
+        def timed():
+            started_at.append(time.monotonic())
+            with self._running_lock:
+                self.running += 1
+            try:
+                return call()
+            finally:
+                with self._running_lock:
+                    self.running -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._pool, timed)
+            self.completed += 1
+            return result
+        finally:
+            finished_at = time.monotonic()
+            if started_at:
+                run_seconds = finished_at - started_at[0]
+                self.wait_seconds_total += started_at[0] - submitted_at
+                self.run_seconds_total += run_seconds
+                self.run_seconds_max = max(self.run_seconds_max, run_seconds)
+
+    def stats(self) -> dict:
+        attempts = self.completed + self.failed + self.retried
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": self.running,
+            "queued": max(self.pending - self.running, 0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.wait_seconds_total / attempts if attempts else 0.0,
+            "avg_run_seconds": self.run_seconds_total / attempts if attempts else 0.0,
+            "max_run_seconds": self.run_seconds_max,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+upload_executor = UploadExecutor()
@@ -1,5 +1,4 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
 import { motion, AnimatePresence } from 'framer-motion';
 import { MessageSquare, X, Send, Loader2 } from 'lucide-react';
 import API_BASE_URL from '../config';
@@ -11,6 +10,7 @@ const Chatbot = () => {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
 
   const scrollToBottom = () => {
@@ -30,15 +30,51 @@ const Chatbot = () => {
     setInput('');
     setIsLoading(true);
 
+    let streamStarted = false;
     try {
-      const response = await axios.post(`${API_BASE_URL}/api/chat`, { 
-        message: userMessage.content,
-        history: [] // Future: Pass history if needed
+      const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message: userMessage.content,
+          session_id: sessionId // The server keeps the conversation history
+        })
       });
+      if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
 
-      setMessages(prev => [...prev, { role: 'system', content: response.data.response }]);
+      // Render the reply as it streams in (Server-Sent Events)
+      setMessages(prev => [...prev, { role: 'system', content: '' }]);
+      streamStarted = true;
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const raw of events) {
+          const lines = raw.split('\n');
+          const event = lines.find(l => l.startsWith('event: '))?.slice(7) || 'message';
+          const data = JSON.parse(lines.find(l => l.startsWith('data: '))?.slice(6) || '{}');
+          if (event === 'error') throw new Error(data.detail);
+          if (event === 'session') setSessionId(data.session_id);
+          if (data.text) {
+            setIsLoading(false);
+            setMessages(prev => {
+              const last = prev[prev.length - 1];
+              return [...prev.slice(0, -1), { ...last, content: last.content + data.text }];
+            });
+          }
+        }
+      }
     } catch (error) {
-      setMessages(prev => [...prev, { role: 'system', content: "I'm having trouble connecting to the design server. Please ensure the backend is running." }]);
+      setMessages(prev => {
+        // Drop the reply bubble if nothing arrived before the failure
+        const rest = streamStarted && !prev[prev.length - 1].content ? prev.slice(0, -1) : prev;
+        return [...rest, { role: 'system', content: "I'm having trouble connecting to the design server. Please ensure the backend is running." }];
+      });
     } finally {
       setIsLoading(false);
     }
@@ -74,7 +110,7 @@ const Chatbot = () => {
             </div>
 
             <div className="flex-1 overflow-y-auto p-4 space-y-4 bg-gray-50">
-              {messages.map((msg, idx) => (
+              {messages.filter(msg => msg.content).map((msg, idx) => (
                 <div 
                   key={idx} 
                   className={`flex ${msg.role === 'user' ? 'justify-end' : 'justify-start'}`}
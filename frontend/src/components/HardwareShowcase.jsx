@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { motion } from 'framer-motion';
 import { useNavigate } from 'react-router-dom';
-import API_BASE_URL, { getImageUrl } from '../config';
+import API_BASE_URL, { getResponsiveImage } from '../config';
 import { ArrowUpRight } from 'lucide-react';
 import smartLockImage from '../assets/smart_lock.png';
 import lockImage from '../assets/hero.png'; 
@@ -92,7 +92,9 @@ const HardwareShowcase = () => {
                   {product.tag}
                 </div>
                 <img 
-                  src={product.image_url ? getImageUrl(product.image_url) : product.image} 
+                  {...(product.image_url
+                    ? getResponsiveImage(product.image_url, product.image_variants, '(min-width: 768px) 33vw, 100vw')
+                    : { src: product.image })} 
                   alt={product.name} 
                   className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-105"
                 />
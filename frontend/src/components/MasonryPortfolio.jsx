@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import axios from 'axios';
-import API_BASE_URL, { getImageUrl } from '../config';
+import API_BASE_URL, { getImageUrl, getResponsiveImage, findMediaVariants } from '../config';
 import kitchenImage from '../assets/kitchen.png';
 import heroImage from '../assets/hero.png';
 import constructionImage from '../assets/construction_site.png';
@@ -144,16 +144,19 @@ const MasonryPortfolio = () => {
   }, []);
 
   const getSiteCoverImage = (site) => {
-    if (site.main_image) return getImageUrl(site.main_image);
+    if (site.main_image) return site.main_image;
     if (site.work_stages && site.work_stages.length > 0) {
       for (const s of site.work_stages) {
         const stageImages = typeof s === 'string' ? [] : (s.images || []);
-        if (stageImages.length > 0) return getImageUrl(stageImages[0]);
+        if (stageImages.length > 0) return stageImages[0];
       }
     }
     return null;
   };
 
+  const siteImageProps = (site, url, sizes) =>
+    getResponsiveImage(url, findMediaVariants(site, url), sizes);
+
   const handleWhatsapp = (project) => {
     const message = encodeURIComponent(`Hi, I'm interested in knowing more about the project: ${project.title}.`);
     window.open(`https://wa.me/916376007979?text=${message}`, '_blank');
@@ -247,13 +250,16 @@ const MasonryPortfolio = () => {
                     <div className="w-full relative">
                       {project.media_type === 'video' ? (
                            <video 
-                             src={project.image} 
+                             src={project.image_variants?.src || project.image} 
+                             poster={project.image_variants?.poster}
                              className="w-full h-auto block rounded-sm transition-transform duration-700 group-hover:scale-105"
                              autoPlay loop muted playsInline
                            />
                       ) : (
                           <img 
-                            src={project.image} 
+                            {...(project.image_variants?.srcset
+                              ? getResponsiveImage(project.image_url, project.image_variants, '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw')
+                              : { src: project.image })} 
                             alt={project.title} 
                             className="w-full h-auto block rounded-sm transition-transform duration-700 group-hover:scale-105"
                           />
@@ -340,7 +346,7 @@ const MasonryPortfolio = () => {
                           <div className="h-48 w-full bg-gray-105 relative overflow-hidden">
                             {coverImage ? (
                               <img 
-                                src={coverImage} 
+                                {...siteImageProps(site, coverImage, '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw')} 
                                 alt={site.site_name} 
                                 className="w-full h-full object-cover transition-transform duration-500 hover:scale-105" 
                               />
@@ -430,13 +436,16 @@ const MasonryPortfolio = () => {
               <div className="md:w-3/5 relative bg-gray-100 h-[300px] md:h-auto overflow-hidden">
                 {selectedProject.media_type === 'video' ? (
                   <video 
-                    src={selectedProject.image} 
+                    src={selectedProject.image_variants?.src || selectedProject.image} 
+                    poster={selectedProject.image_variants?.poster}
                     className="w-full h-full object-cover"
                     autoPlay loop muted playsInline
                   />
                 ) : (
                   <img 
-                    src={selectedProject.image} 
+                    {...(selectedProject.image_variants?.srcset
+                      ? getResponsiveImage(selectedProject.image_url, selectedProject.image_variants, '(min-width: 768px) 60vw, 100vw')
+                      : { src: selectedProject.image })} 
                     alt={selectedProject.title} 
                     className="w-full h-full object-cover"
                   />
@@ -526,7 +535,7 @@ const MasonryPortfolio = () => {
                       <h4 className="text-xs font-bold text-gray-400 uppercase tracking-widest mb-2">Main Cover Photo</h4>
                       <div className="aspect-video w-full rounded-xl overflow-hidden shadow-sm border border-gray-200">
                         <img 
-                          src={getImageUrl(selectedTrackerSite.main_image)} 
+                          {...siteImageProps(selectedTrackerSite, selectedTrackerSite.main_image, '(min-width: 768px) 60vw, 100vw')} 
                           alt={selectedTrackerSite.site_name} 
                           className="w-full h-full object-cover" 
                         />
@@ -569,7 +578,7 @@ const MasonryPortfolio = () => {
                                   className="group relative aspect-[4/3] rounded-lg overflow-hidden shadow-sm hover:shadow-md transition-all block border border-gray-200"
                                 >
                                   <img 
-                                    src={resolvedImg} 
+                                    {...siteImageProps(selectedTrackerSite, img, '(min-width: 640px) 20vw, 50vw')} 
                                     alt={`${stageObj.name} update ${idx + 1}`} 
                                     className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-105" 
                                   />
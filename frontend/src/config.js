@@ -8,3 +8,14 @@ export const getImageUrl = (url) => {
   if (url.startsWith('http')) return url;
   return `${API_BASE_URL}${url}`;
 };
+
+// <img> props using the responsive variants stored with each upload
+// (image_variants / media_variants); falls back to the original URL
+export const getResponsiveImage = (url, variants, sizes = '100vw') => {
+  if (!variants || !variants.srcset) return { src: getImageUrl(url) };
+  return { src: variants.src, srcSet: variants.srcset, sizes };
+};
+
+// Project updates keep one media_variants entry per image URL
+export const findMediaVariants = (site, url) =>
+  (site && site.media_variants || []).find(v => v.url === url);
@@ -9,6 +9,7 @@ const AdminDashboard = () => {
   const [activeTab, setActiveTab] = useState('portfolio');
   const [items, setItems] = useState([]);
   const [leads, setLeads] = useState([]);
+  const [leadsCursor, setLeadsCursor] = useState(null);
   const [hardwareItems, setHardwareItems] = useState([]);
   const [projectUpdates, setProjectUpdates] = useState([]);
   
@@ -41,6 +42,7 @@ const AdminDashboard = () => {
   const [mainImageFile, setMainImageFile] = useState(null);
   const [stageFiles, setStageFiles] = useState({}); // stageName -> Array of Files
   const [editingUpdateId, setEditingUpdateId] = useState(null);
+  const [editingVersion, setEditingVersion] = useState(null); // rejected with 409 if someone else saved since
 
   const [loadingPortfolio, setLoadingPortfolio] = useState(false);
   const [loadingHardware, setLoadingHardware] = useState(false);
@@ -58,13 +60,15 @@ const AdminDashboard = () => {
     }
   };
 
-  const fetchLeads = async () => {
+  const fetchLeads = async (cursor = null) => {
     const token = localStorage.getItem('token');
     try {
       const response = await axios.get(`${API_BASE_URL}/api/leads`, {
-        headers: { Authorization: `Bearer ${token}` }
+        headers: { Authorization: `Bearer ${token}` },
+        params: cursor ? { cursor } : {}
       });
-      setLeads(response.data);
+      setLeads(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setLeadsCursor(response.data.next_cursor);
     } catch (error) {
       console.error("Error fetching leads", error);
     }
@@ -228,6 +232,7 @@ const AdminDashboard = () => {
 
   const handleStartEdit = (update) => {
     setEditingUpdateId(update.id);
+    setEditingVersion(update.version ?? 0);
     
     // Normalize work stages (if legacy string format, map to {name, images})
     const normalizedStages = (update.work_stages || []).map(stage => {
@@ -256,6 +261,7 @@ const AdminDashboard = () => {
 
   const handleCancelEdit = () => {
     setEditingUpdateId(null);
+    setEditingVersion(null);
     setNewUpdate({
       site_name: '',
       client_name: '',
@@ -277,6 +283,9 @@ const AdminDashboard = () => {
     formData.append('location', newUpdate.location);
     formData.append('category', newUpdate.category);
     formData.append('work_stages', JSON.stringify(newUpdate.work_stages));
+    if (editingUpdateId && editingVersion !== null) {
+      formData.append('version', editingVersion);
+    }
     
     if (mainImageFile) {
       formData.append('main_image', mainImageFile);
@@ -295,8 +304,9 @@ const AdminDashboard = () => {
 
     try {
       const token = localStorage.getItem('token');
+      let response;
       if (editingUpdateId) {
-        await axios.put(`${API_BASE_URL}/api/project-updates/${editingUpdateId}`, formData, {
+        response = await axios.put(`${API_BASE_URL}/api/project-updates/${editingUpdateId}`, formData, {
           headers: { 
             'Authorization': `Bearer ${token}`,
             'Content-Type': 'multipart/form-data'
@@ -304,7 +314,7 @@ const AdminDashboard = () => {
         });
         alert("Project update updated successfully!");
       } else {
-        await axios.post(`${API_BASE_URL}/api/project-updates`, formData, {
+        response = await axios.post(`${API_BASE_URL}/api/project-updates`, formData, {
           headers: { 
             'Authorization': `Bearer ${token}`,
             'Content-Type': 'multipart/form-data'
@@ -312,6 +322,10 @@ const AdminDashboard = () => {
         });
         alert("Project update added successfully!");
       }
+      const failed = response.data.failed_uploads || [];
+      if (failed.length > 0) {
+        alert(`${failed.length} file(s) failed to upload:\n` + failed.map(f => `${f.filename}: ${f.error}`).join('\n'));
+      }
       setNewUpdate({ 
         site_name: '', 
         client_name: '', 
@@ -323,6 +337,7 @@ const AdminDashboard = () => {
       setMainImageFile(null);
       setStageFiles({});
       setEditingUpdateId(null);
+      setEditingVersion(null);
       fetchProjectUpdates();
     } catch (error) {
        console.error(error);
@@ -680,6 +695,15 @@ const AdminDashboard = () => {
                    ))
                  )}
                </div>
+
+               {leadsCursor && (
+                 <button
+                   onClick={() => fetchLeads(leadsCursor)}
+                   className="w-full mt-6 py-3 text-sm font-bold text-primary border border-gray-200 rounded-lg hover:bg-white transition-colors"
+                 >
+                   Load more
+                 </button>
+               )}
             </div>
           )}
 
@@ -4,7 +4,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { X, Search } from 'lucide-react';
 import Navbar from '../components/Navbar';
 import Footer from '../components/Footer';
-import API_BASE_URL, { getImageUrl } from '../config';
+import API_BASE_URL, { getResponsiveImage } from '../config';
 
 const HardwareCatalog = () => {
   const [products, setProducts] = useState([]);
@@ -78,7 +78,7 @@ const HardwareCatalog = () => {
                         {product.tag}
                       </div>
                       <img 
-                        src={getImageUrl(product.image_url)} 
+                        {...getResponsiveImage(product.image_url, product.image_variants, '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw')} 
                         alt={product.name} 
                         className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-105"
                       />